@@ -1,69 +1,1572 @@
+import time as time_module
+STARTED = time_module.perf_counter()  # cold start is measured from here, before the imports
 import tkinter as tk
-from tkinter import ttk, messagebox
-import yfinance as yf
+from tkinter import ttk, messagebox, filedialog
+import argparse
 import csv
+import json
 import os
+import sqlite3
 import sys
-from datetime import datetime, time
+from datetime import datetime, time, date, timedelta
 import pytz
 import math
-import time as time_module
+import numpy as np
 import threading
+import multiprocessing
+import random
+import zlib
+import logging
+from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import deque
+from queue import SimpleQueue, Empty
+from contextlib import contextmanager
+from array import array
+
+VERSION = "1.9"
+
+log = logging.getLogger("OptionsMonitor")
+
+
+@contextmanager
+def atomic_write(path, mode='w', newline=None):
+    # Write path.tmp, flush it to disk, then swap it in: a crash or power cut leaves either the old
+    # file or the complete new one, never a truncated one. The temp file is removed if writing fails.
+    temp_file = path + ".tmp"
+    try:
+        with open(temp_file, mode, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        raise
+
+
+class Metrics:
+    # Rolling timings (the last window samples of each) and running counters. Fetch threads and the
+    # Tk thread all record here; times are in seconds.
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.counters = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time_module.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time_module.perf_counter() - start)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        # {"timings": {name: {count, p50, p90, p99, max}}, "counters": {name: n}}
+        with self.lock:
+            samples = {name: np.array(values) for name, values in self.samples.items() if values}
+            counters = dict(self.counters)
+        timings = {}
+        for name, values in sorted(samples.items()):
+            p50, p90, p99 = np.percentile(values, (50, 90, 99)).tolist()
+            timings[name] = {"count": len(values), "p50": p50, "p90": p90, "p99": p99, "max": float(values.max())}
+        return {"timings": timings, "counters": dict(sorted(counters.items()))}
+
+    def write(self, path):
+        report = {"time": datetime.now().isoformat(timespec="seconds"), **self.snapshot()}
+        with atomic_write(path) as f:
+            json.dump(report, f, indent=2)
+
+
+metrics = Metrics()
+
+_yf = None
+_yf_lock = threading.Lock()
+
+
+def load_yfinance():
+    # yfinance brings pandas and requests with it, seconds of a frozen exe's startup. It is imported on
+    # the first fetch instead, on the fetch thread, while the window already shows the cached book.
+    global _yf
+    with _yf_lock:
+        if _yf is None:
+            start = time_module.perf_counter()
+            import yfinance
+            elapsed = time_module.perf_counter() - start
+            metrics.record("startup.import_yfinance", elapsed)
+            log.info("Startup: yfinance imported in %.2fs", elapsed)
+            _yf = yfinance
+    return _yf
+
+class Position:
+    # One option position; id is assigned by the store and never reused
+    __slots__ = ("id", "ticker", "ends", "option", "contracts", "premium", "strike")
+    FIELDS = ("ticker", "ends", "option", "contracts", "premium", "strike")  # CSV / column order
+
+    def __init__(self, pid, ticker, ends, option, contracts, premium, strike):
+        self.id = pid
+        self.ticker = ticker
+        self.ends = ends
+        self.option = option
+        self.contracts = contracts
+        self.premium = premium
+        self.strike = strike
+
+
+class PositionStore:
+    # Positions keyed by stable id; dict order is the saved order. version changes on every mutation.
+    def __init__(self):
+        self._positions = {}
+        self._next_id = 1
+        self.version = 0
+
+    def __iter__(self):
+        return iter(self._positions.values())
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, pid):
+        return pid in self._positions
+
+    def get(self, pid):
+        return self._positions.get(pid)
+
+    def tickers(self):
+        return {position.ticker for position in self._positions.values()}
+
+    def add(self, ticker, ends, option, contracts, premium, strike, pid=None):
+        # pid is only given when a backend restores its own ids
+        position = Position(self._next_id if pid is None else pid, ticker, ends, option, contracts, premium, strike)
+        self._positions[position.id] = position
+        self._next_id = max(self._next_id, position.id) + 1
+        self.version += 1
+        return position
+
+    def extend(self, tickers, ends, options, contracts, premiums, strikes):
+        # Bulk add from parallel columns, one version bump for the lot
+        pid = self._next_id
+        positions = self._positions
+        for values in zip(tickers, ends, options, contracts, premiums, strikes):
+            positions[pid] = Position(pid, *values)
+            pid += 1
+        self._next_id = pid
+        self.version += 1
+
+    def update(self, pid, field, value):
+        setattr(self._positions[pid], field, value)
+        self.version += 1
+
+    def remove(self, pids):
+        removed = [self._positions.pop(pid) for pid in pids if pid in self._positions]
+        if removed:
+            self.version += 1
+        return removed
+
+    def clear(self):
+        self._positions = {}
+        self.version += 1
+
+
+class ImportReport:
+    # What reading a positions file took and what it rejected, by line number
+    MAX_DETAILS = 1000  # rejected rows kept with details; the count keeps going past this
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.details = []
+        self.error = None
+
+    def reject(self, line, reason, row):
+        self.rejected += 1
+        if len(self.details) < self.MAX_DETAILS:
+            self.details.append((line, reason, row))
+
+    def summary(self, limit=10):
+        lines = [f"Imported {self.accepted:,} positions."]
+        if self.error:
+            lines.append(f"Stopped early: {self.error}")
+        if self.rejected:
+            lines.append(f"{self.rejected:,} rows rejected:")
+            lines += [f"Line {line}: {reason}" for line, reason, _ in self.details[:limit]]
+            if self.rejected > limit:
+                lines.append("...")
+        return "\n".join(lines)
+
+    def write(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Line", "Reason", "Row"])
+            for line, reason, row in self.details:
+                writer.writerow([line, reason, ",".join(row)])
+
+
+def stream_positions_csv(path, report, chunk_size=50000, strict=True):
+    # Reads a positions file in chunks, yielding (columns, fraction_read). columns are parallel
+    # ticker/ends/option lists and contracts/premium/strike arrays, ready for PositionStore.extend.
+    # Accepts the 6-column format and the old 5-column one without Premium. strict=False is for the
+    # app's own data.csv: only rows the original loader skipped (column count, numbers) are rejected,
+    # and text columns are kept as saved, so a save never drops rows that loaded before.
+    size = os.path.getsize(path) or 1
+    read = 0
+
+    def counted(f):
+        nonlocal read
+        for text in f:
+            read += len(text)
+            yield text
+
+    def new_columns():
+        return [], [], [], array('q'), array('d'), array('d')
+
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(counted(f))
+        columns = new_columns()
+        for row in reader:
+            if not row or row[0] == "Ticker":  # skip blank lines and the header
+                continue
+            line = reader.line_num
+            if len(row) == 5:
+                premium_text, strike_text = "0", row[4]
+            elif len(row) == 6:
+                premium_text, strike_text = row[4], row[5]
+            else:
+                report.reject(line, f"expected 5 or 6 columns, got {len(row)}", row)
+                continue
+
+            if strict:
+                ticker = row[0].strip().upper()
+                ends = row[1].strip()
+                option = row[2].strip().capitalize()
+                if not ticker:
+                    report.reject(line, "missing Ticker", row)
+                    continue
+                if ends and ends.count('/') != 1:
+                    report.reject(line, f"Ends '{ends}' is not M/D", row)
+                    continue
+                if option not in ("Call", "Put"):
+                    report.reject(line, f"Option '{row[2]}' is not Call or Put", row)
+                    continue
+            else:
+                ticker, ends, option = row[0], row[1], row[2]
+            try:
+                contracts = int(row[3])
+            except ValueError:
+                report.reject(line, f"Contracts '{row[3]}' is not a whole number", row)
+                continue
+            try:
+                premium = float(premium_text)
+                strike = float(strike_text)
+            except ValueError:
+                report.reject(line, f"Premium '{premium_text}' or Strike '{strike_text}' is not a number", row)
+                continue
+            if strict and not (math.isfinite(premium) and math.isfinite(strike)):
+                report.reject(line, "Premium and Strike must be finite", row)
+                continue
+
+            for column, value in zip(columns, (ticker, ends, option, contracts, premium, strike)):
+                column.append(value)
+            report.accepted += 1
+            if len(columns[0]) >= chunk_size:
+                yield columns, read / size
+                columns = new_columns()
+        if columns[0]:
+            yield columns, read / size
+
+
+def read_positions_csv(path, store, report=None, strict=True):
+    report = ImportReport() if report is None else report
+    for columns, _ in stream_positions_csv(path, report, strict=strict):
+        store.extend(*columns)
+    return report
+
+
+def write_positions_csv(path, positions):
+    # Write header then data rows (header will be ignored on load), atomically
+    with atomic_write(path, newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Ticker", "Ends", "Option", "Contracts", "Premium", "Strike"])
+        for position in positions:
+            writer.writerow([
+                position.ticker,
+                position.ends,
+                position.option,
+                str(position.contracts),
+                str(position.premium),
+                str(position.strike)
+            ])
+
+
+class CsvStorage:
+    # data.csv as the book; every change rewrites the file (atomically)
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, report=None):
+        store = PositionStore()
+        try:
+            read_positions_csv(self.path, store, report, strict=False)
+        except FileNotFoundError:
+            pass
+        return store
+
+    def save(self, store):
+        write_positions_csv(self.path, store)
+
+    def insert(self, store, position):
+        self.save(store)
+
+    def update(self, store, position, field):
+        self.save(store)
+
+    def delete(self, store, pids):
+        self.save(store)
+
+    def clear(self, store):
+        self.save(store)
+
+
+class SqliteStorage:
+    # data.db as the book; every change is a single-row write in its own transaction.
+    # A new database is seeded from data.csv once; the meta table records that, so a book
+    # emptied later (Remove All) stays empty instead of coming back from the old CSV.
+    def __init__(self, path, csv_path=None):
+        self.path = path
+        self.csv_path = csv_path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS positions (id INTEGER PRIMARY KEY, ticker TEXT NOT NULL, ends TEXT NOT NULL,"
+                " option TEXT NOT NULL, contracts INTEGER NOT NULL, premium REAL NOT NULL, strike REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def load(self, report=None):
+        store = PositionStore()
+        for pid, ticker, ends, option, contracts, premium, strike in self.conn.execute(
+                "SELECT id, ticker, ends, option, contracts, premium, strike FROM positions ORDER BY id"):
+            store.add(ticker, ends, option, contracts, premium, strike, pid=pid)
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone() is None:
+            if not len(store) and self.csv_path and os.path.exists(self.csv_path):
+                read_positions_csv(self.csv_path, store, report, strict=False)
+                self.save(store)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('seeded', '1')")
+        return store
+
+    def save(self, store):
+        with self.conn:
+            self.conn.execute("DELETE FROM positions")
+            self.conn.executemany("INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)", (self._values(p) for p in store))
+
+    def insert(self, store, position):
+        with self.conn:
+            self.conn.execute("INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)", self._values(position))
+
+    def update(self, store, position, field):
+        if field not in Position.FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        with self.conn:
+            self.conn.execute(f"UPDATE positions SET {field} = ? WHERE id = ?", (getattr(position, field), position.id))
+
+    def delete(self, store, pids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM positions WHERE id = ?", ((pid,) for pid in pids))
+
+    def clear(self, store):
+        with self.conn:
+            self.conn.execute("DELETE FROM positions")
+
+    @staticmethod
+    def _values(position):
+        return (position.id, position.ticker, position.ends, position.option, position.contracts, position.premium, position.strike)
+
+
+class QuoteProvider:
+    # Source of last prices. fetch() returns {ticker: price or "?"} and may call callback (from the
+    # calling thread) with partial results as they come in.
+    def fetch(self, tickers, callback=None):
+        raise NotImplementedError
+
+    def fetch_chain(self, ticker, expiry):
+        # Option chain for one expiry date: {(is_call, strike): (bid, ask, last)}
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class YahooQuoteProvider(QuoteProvider):
+    def __init__(self, batch_size=100, workers=8):
+        self.batch_size = batch_size  # tickers per bulk download request
+        self.pool = ThreadPoolExecutor(max_workers=workers)  # concurrent per-ticker lookups
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def fetch(self, tickers, callback=None):
+        # Bulk download in batches, then per-ticker lookup only for symbols the batch missed.
+        # callback (if given) is called from the worker thread with each partial result.
+        tickers = sorted(tickers)
+        quotes = {}
+        start = time_module.perf_counter()
+        for i in range(0, len(tickers), self.batch_size):
+            with metrics.timer("fetch.batch"):
+                batch = self._batch_quotes(tickers[i:i + self.batch_size])
+            quotes.update(batch)
+            if batch and callback is not None:
+                callback(batch)
+        batch_time = time_module.perf_counter() - start
+
+        def timed_lookup(ticker):
+            lookup_start = time_module.perf_counter()
+            quote = self._lookup_ticker(ticker)
+            elapsed = time_module.perf_counter() - lookup_start
+            metrics.record("fetch.lookup", elapsed)
+            return quote, elapsed
+
+        missing = [t for t in tickers if t not in quotes]
+        start = time_module.perf_counter()
+        looped_time = 0.0
+        futures = {self.pool.submit(timed_lookup, t): t for t in missing}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            quotes[ticker], elapsed = future.result()
+            looped_time += elapsed
+            if callback is not None:
+                callback({ticker: quotes[ticker]})
+        single_time = time_module.perf_counter() - start
+
+        metrics.count("fetch.tickers", len(tickers))
+        metrics.count("fetch.batch_missed", len(missing))
+        if tickers:
+            # Sequential per-ticker time extrapolated to the whole set, for comparison with the batch
+            looped = f", ~{looped_time / len(missing) * len(tickers):.2f}s if looped" if missing else ""
+            log.debug("Batch %d/%d: %.2fs, Per-ticker %d: %.2fs%s",
+                      len(tickers) - len(missing), len(tickers), batch_time, len(missing), single_time, looped)
+        return quotes
+
+    def _batch_quotes(self, tickers):
+        quotes = {}
+        try:
+            frame = load_yfinance().download(tickers, period="1d", group_by="ticker", progress=False, threads=True, auto_adjust=False)
+        except Exception as e:
+            metrics.count(f"fetch.failed.batch.{type(e).__name__}")
+            log.warning("Batch %d: Failed, Error: %s", len(tickers), e)
+            return quotes
+        if frame is None or frame.empty:
+            return quotes
+        for ticker in tickers:
+            try:
+                close = frame[ticker]["Close"] if frame.columns.nlevels > 1 else frame["Close"]
+            except KeyError:
+                continue
+            close = close.dropna()
+            if not close.empty:
+                quotes[ticker] = round(float(close.iloc[-1]), 2)
+        return quotes
+
+    def _lookup_ticker(self, ticker):
+        quote = "?"
+        for attempt in range(3):
+            try:
+                yf_ticker = load_yfinance().Ticker(ticker)
+                quote = yf_ticker.get_info().get('regularMarketPrice', None)
+                if quote is None or (isinstance(quote, float) and math.isnan(quote)):
+                    history = yf_ticker.history(period="1d")
+                    quote = round(history["Close"].iloc[-1], 2) if not history.empty and not math.isnan(history["Close"].iloc[-1]) else None
+                quote = quote if quote is not None and not math.isnan(quote) else "?"
+                if quote == "?":
+                    metrics.count("fetch.failed.lookup.NoPrice")
+                log.debug("Lookup %s: %s", ticker, quote)
+                break
+            except Exception as e:
+                metrics.count(f"fetch.failed.lookup.{type(e).__name__}")
+                log.warning("Lookup %s: Failed, Error: %s", ticker, e)
+                if attempt < 2:
+                    metrics.count("fetch.retries")
+                    time_module.sleep(self._backoff_delay(attempt))
+                quote = "?"
+        return quote
+
+    def fetch_chain(self, ticker, expiry):
+        # Raises if Yahoo lists no chain for that date (Ends that is not a listed expiry)
+        chain = load_yfinance().Ticker(ticker).option_chain(expiry.isoformat())
+        table = {}
+        for is_call, frame in ((True, chain.calls), (False, chain.puts)):
+            for strike, bid, ask, last in zip(frame["strike"].tolist(), frame["bid"].tolist(),
+                                              frame["ask"].tolist(), frame["lastPrice"].tolist()):
+                table[(is_call, float(strike))] = (bid, ask, last)
+        return table
+
+    def _backoff_delay(self, attempt, base=0.5, cap=8.0):
+        # Exponential backoff with full jitter, so parallel retries don't hit Yahoo in lockstep
+        return random.uniform(0, min(cap, base * (2 ** (attempt + 1))))
+
+
+class ReplayQuoteProvider(QuoteProvider):
+    # Offline quotes for testing and load runs. Tickers found in the recorded file (Ticker,Price rows,
+    # replayed in order and looped) get their series; any other ticker follows a seeded random walk.
+    # Every batch waits latency seconds, and each ticker fails ("?") with probability failure_rate.
+    def __init__(self, path=None, latency=0.0, failure_rate=0.0, volatility=0.01, batch_size=100, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.volatility = volatility
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.series = {}
+        self.steps = {}
+        self.prices = {}
+        self.lock = threading.Lock()
+        if path:
+            with open(path, 'r', newline='') as f:
+                for row in csv.reader(f):
+                    if len(row) < 2 or row[0] == "Ticker":
+                        continue
+                    try:
+                        self.series.setdefault(row[0].upper(), []).append(float(row[1]))
+                    except ValueError:
+                        continue
+
+    def fetch(self, tickers, callback=None):
+        tickers = sorted(tickers)
+        quotes = {}
+        for i in range(0, len(tickers), self.batch_size):
+            with metrics.timer("fetch.batch"):
+                if self.latency:
+                    time_module.sleep(self.latency)
+                with self.lock:
+                    batch = {ticker: self._next_price(ticker) for ticker in tickers[i:i + self.batch_size]}
+            quotes.update(batch)
+            if callback is not None:
+                callback(batch)
+        return quotes
+
+    def fetch_chain(self, ticker, expiry, volatility=0.35, spread=0.03):
+        # Black-Scholes prices around the ticker's last replayed price, every 0.50 of strike up to 3x the price
+        if self.latency:
+            time_module.sleep(self.latency)
+        with self.lock:
+            if ticker in self.series:
+                series = self.series[ticker]
+                price = series[(self.steps.get(ticker, 1) - 1) % len(series)]
+            else:
+                price = self.prices.get(ticker) or random.Random(zlib.crc32(ticker.encode())).uniform(10, 500)
+        years = max((expiry - date.today()).days, 0.5) / 365
+        strikes = np.arange(1, int(price * 6) + 1) / 2
+        table = {}
+        for is_call in (True, False):
+            calls = np.full(len(strikes), is_call)
+            spot = np.full(len(strikes), float(price))
+            sqrt_t = np.full(len(strikes), math.sqrt(years))
+            discount = np.full(len(strikes), math.exp(-0.04 * years))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                marks = black_scholes(calls, spot, strikes, sqrt_t, discount, np.full(len(strikes), volatility))[0]
+            for strike, mark in zip(strikes.tolist(), np.maximum(marks, 0).tolist()):
+                table[(is_call, strike)] = (round(max(0.0, mark * (1 - spread) - 0.01), 2), round(mark * (1 + spread) + 0.01, 2), round(mark, 2))
+        return table
+
+    def _next_price(self, ticker):
+        if self.random.random() < self.failure_rate:
+            metrics.count("fetch.failed.lookup.Replay")
+            return "?"
+        if ticker in self.series:
+            series = self.series[ticker]
+            step = self.steps.get(ticker, 0)
+            self.steps[ticker] = step + 1
+            return series[step % len(series)]
+        price = self.prices.get(ticker)
+        if price is None:
+            price = random.Random(zlib.crc32(ticker.encode())).uniform(10, 500)  # same start for a ticker every run
+        else:
+            price *= math.exp(self.random.gauss(0, self.volatility))
+        self.prices[ticker] = price
+        return round(price, 2)
+
+
+class OptionChainCache:
+    # Option chains per (ticker, expiry date). One fetch serves every position on that pair, and the
+    # result is reused for ttl seconds; a pair already in flight is not fetched again.
+    def __init__(self, provider, ttl=300, workers=4):
+        self.provider = provider
+        self.ttl = ttl
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.chains = {}  # (ticker, expiry) -> (fetched, {(is_call, strike): (bid, ask, last)})
+        self.in_flight = set()
+
+    def get(self, pair):
+        with self.lock:
+            entry = self.chains.get(pair)
+        return None if entry is None else entry[1]
+
+    def request(self, pairs, on_result):
+        # on_result(pair) is called from a worker thread as each stale or missing chain arrives
+        now = time_module.time()
+        with self.lock:
+            todo = [pair for pair in pairs if pair not in self.in_flight
+                    and (pair not in self.chains or now - self.chains[pair][0] > self.ttl)]
+            self.in_flight.update(todo)
+        for pair in todo:
+            self.pool.submit(self._fetch, pair, on_result)
+        return len(todo)
+
+    def _fetch(self, pair, on_result):
+        start = time_module.perf_counter()
+        try:
+            table = self.provider.fetch_chain(*pair)
+        except Exception as e:
+            metrics.count(f"chain.failed.{type(e).__name__}")
+            log.warning("Chain %s %s: Failed, Error: %s", pair[0], pair[1], e)
+            table = {}
+        metrics.record("chain.fetch", time_module.perf_counter() - start)
+        with self.lock:
+            self.chains[pair] = (time_module.time(), table)
+            self.in_flight.discard(pair)
+        on_result(pair)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_quote_provider(source, data_dir, batch_size=100, workers=8):
+    # "yahoo", or "replay" (replay.csv in data_dir if present, else synthetic)
+    if source == "replay":
+        replay_file = os.path.join(data_dir, "replay.csv")
+        return ReplayQuoteProvider(replay_file if os.path.exists(replay_file) else None, batch_size=batch_size)
+    return YahooQuoteProvider(batch_size, workers)
+
+
+class FetchCoordinator:
+    # Single-flight quote fetching for the whole app: one queue, one dispatcher thread. A ticker already
+    # queued or in flight is never fetched twice at once; later requests just wait for that result.
+    # Priority requests (newly added tickers) go out in their own batch ahead of any sweep. Each batch
+    # gets an increasing sequence number, passed to on_result(quotes, seq) so stale results can be dropped.
+    def __init__(self, provider, on_result, batch_size=100):
+        self.provider = provider
+        self.on_result = on_result
+        self.batch_size = batch_size
+        self.cond = threading.Condition()
+        self.priority = deque()
+        self.normal = deque()
+        self.queued = set()
+        self.in_flight = set()
+        self.requested = {}  # ticker -> perf_counter when first queued, for fetch.latency
+        self.waiters = []  # [tickers still outstanding, on_done]
+        self.seq = 0
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def request(self, tickers, priority=False, on_done=None):
+        # on_done is called (from the dispatcher thread) once every requested ticker has a result
+        with self.cond:
+            outstanding = set()
+            for ticker in tickers:
+                outstanding.add(ticker)
+                if ticker in self.in_flight:
+                    continue
+                if ticker not in self.queued or priority:  # a priority request promotes an already queued ticker
+                    (self.priority if priority else self.normal).append(ticker)
+                    self.queued.add(ticker)
+                    self.requested.setdefault(ticker, time_module.perf_counter())
+            if on_done is not None and outstanding:
+                self.waiters.append([outstanding, on_done])
+            self.cond.notify()
+        if on_done is not None and not outstanding:
+            on_done()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def _next_batch(self):
+        batch = []
+        for queue in (self.priority, self.normal):
+            while queue and len(batch) < self.batch_size:
+                ticker = queue.popleft()
+                if ticker in self.queued:  # skip leftovers of promoted tickers
+                    self.queued.discard(ticker)
+                    batch.append(ticker)
+            if batch:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.closed and not self.queued:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                batch = self._next_batch()
+                self.in_flight.update(batch)
+                self.seq += 1
+                seq = self.seq
+
+            def deliver(partial, seq=seq):
+                now = time_module.perf_counter()
+                with self.cond:
+                    requested = [self.requested.pop(ticker, None) for ticker in partial]
+                for start in requested:
+                    if start is not None:
+                        metrics.record("fetch.latency", now - start)
+                self.on_result(partial, seq)
+
+            quotes = {}
+            start = time_module.perf_counter()
+            try:
+                quotes = self.provider.fetch(batch, deliver)
+            except Exception:
+                log.exception("Fetch %d tickers: Failed", len(batch))
+            metrics.record("fetch.round", time_module.perf_counter() - start)
+            missing = {ticker: "?" for ticker in batch if ticker not in quotes}
+            if missing:
+                deliver(missing)
+
+            with self.cond:
+                self.in_flight.difference_update(batch)
+                for waiter in self.waiters:
+                    waiter[0].difference_update(batch)
+                done = [on_done for outstanding, on_done in self.waiters if not outstanding]
+                self.waiters = [waiter for waiter in self.waiters if waiter[0]]
+            for on_done in done:
+                on_done()
+
+class MarketCalendar:
+    # NYSE regular sessions in US/Eastern: 9:30-16:00 on weekdays, closed on exchange holidays, 13:00 close
+    # on half days. Holidays are generated from the exchange's standing rules; one-off closures are listed below.
+    TZ = pytz.timezone('US/Eastern')
+    OPEN = time(9, 30)
+    CLOSE = time(16, 0)
+    EARLY_CLOSE = time(13, 0)
+    SPECIAL_CLOSURES = {
+        date(2018, 12, 5),  # President George H. W. Bush
+        date(2025, 1, 9),   # President Jimmy Carter
+    }
+
+    def __init__(self):
+        self._years = {}
+
+    def is_open(self, now):
+        session = self.session(now.date())
+        return session is not None and session[0] <= now < session[1]
+
+    def session(self, day):
+        # (open, close) as aware datetimes, or None if the exchange is closed that day
+        holidays, early_closes = self._year(day.year)
+        if day.weekday() >= 5 or day in holidays:
+            return None
+        close = self.EARLY_CLOSE if day in early_closes else self.CLOSE
+        return (self.TZ.localize(datetime.combine(day, self.OPEN)), self.TZ.localize(datetime.combine(day, close)))
+
+    def next_transition(self, now):
+        # (when, opens) for the next open or close after now
+        day = now.date()
+        for offset in range(15):  # longest closure on record is well under two weeks
+            session = self.session(day + timedelta(days=offset))
+            if session is None:
+                continue
+            if now < session[0]:
+                return session[0], True
+            if now < session[1]:
+                return session[1], False
+        return now + timedelta(days=1), False
+
+    def last_close(self, now):
+        # End of the most recent session that closed at or before now
+        day = now.date()
+        for offset in range(15):
+            session = self.session(day - timedelta(days=offset))
+            if session is not None and session[1] <= now:
+                return session[1]
+        return now - timedelta(days=15)
+
+    def _year(self, year):
+        if year not in self._years:
+            self._years[year] = self._build_year(year)
+        return self._years[year]
+
+    def _build_year(self, year):
+        def nth_weekday(month, weekday, n):
+            first = date(year, month, 1)
+            return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+        def last_weekday(month, weekday):
+            last = date(year, month + 1, 1) - timedelta(days=1)
+            return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+        def observed(day):
+            # Saturday holidays move to Friday, Sunday ones to Monday
+            return day - timedelta(days=1) if day.weekday() == 5 else day + timedelta(days=1) if day.weekday() == 6 else day
+
+        new_year = date(year, 1, 1)
+        holidays = {
+            nth_weekday(1, 0, 3),                # Martin Luther King Jr. Day
+            nth_weekday(2, 0, 3),                # Washington's Birthday
+            self._easter(year) - timedelta(days=2),  # Good Friday
+            last_weekday(5, 0),                  # Memorial Day
+            observed(date(year, 7, 4)),          # Independence Day
+            nth_weekday(9, 0, 1),                # Labor Day
+            nth_weekday(11, 3, 4),               # Thanksgiving
+            observed(date(year, 12, 25)),        # Christmas
+        }
+        if new_year.weekday() != 5:  # a Saturday New Year's Day is not made up on the Friday before
+            holidays.add(observed(new_year))
+        if year >= 2022:
+            holidays.add(observed(date(year, 6, 19)))  # Juneteenth
+        holidays |= {day for day in self.SPECIAL_CLOSURES if day.year == year}
+
+        early_closes = {nth_weekday(11, 3, 4) + timedelta(days=1)}  # day after Thanksgiving
+        for day in (date(year, 7, 3), date(year, 12, 24)):
+            if day.weekday() < 4 and day not in holidays:  # Monday-Thursday only
+                early_closes.add(day)
+        return holidays, early_closes
+
+    @staticmethod
+    def _easter(year):
+        # Anonymous Gregorian algorithm
+        a, b, c = year % 19, year // 100, year % 100
+        d, e = b // 4, b % 4
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = c // 4, c % 4
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        month, day = divmod(h + l - 7 * m + 114, 31)
+        return date(year, month, day + 1)
+
+def expiry_date(month, day, today):
+    # Ends carries no year: take the nearest such date that is no more than a month in the past,
+    # so a position that expired last week stays last week and a January date seen in December is next year
+    try:
+        expiry = date(today.year, month, day)
+    except ValueError:
+        return None
+    if (today - expiry).days > 31:
+        expiry = date(today.year + 1, month, day)
+    return expiry
+
+
+def refresh_intervals(valuation, today, min_interval, max_interval, daily_move=0.02):
+    # Seconds between refreshes for each ticker in valuation.tickers. A position z typical moves
+    # (daily_move of the price, scaled by the square root of days left) away from flipping its Outcome
+    # wants min_interval * (1 + z)^2; each ticker refreshes as often as its most urgent position needs.
+    # Expired positions can no longer flip, so they ask for max_interval, as _expiry_terms leaves them out.
+    days_by_key = {}
+    for key in np.unique(valuation.ends_key).tolist():
+        expiry = expiry_date(int(key) // 100, int(key) % 100, today)
+        days_by_key[key] = 365 if expiry is None else (expiry - today).days
+    days = np.array([days_by_key[key] for key in valuation.ends_key.tolist()], dtype=float)
+    expired = days < 0
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.abs(valuation.diff) / (valuation.current * daily_move * np.sqrt(np.maximum(days, 0) + 1))
+    wanted = np.clip(min_interval * (1 + z) ** 2, min_interval, max_interval)
+    wanted[np.isnan(wanted)] = min_interval  # no quote yet
+    wanted[expired] = max_interval
+    intervals = np.full(len(valuation.tickers), float(max_interval))
+    np.minimum.at(intervals, valuation.codes, wanted)
+    return intervals
+
+
+def value_book(is_call, contracts, premium, strike, current):
+    # Diff, ITM flag and expiration Value for every position in one pass.
+    # current is NaN where no quote is known; Diff is NaN there and Value is NaN unless ITM.
+    with np.errstate(invalid='ignore'):
+        diff = np.subtract(current, strike)
+        np.negative(diff, out=diff, where=~np.asarray(is_call))  # Put: strike - current
+        itm = diff > 0
+        # Put assigned: (current - (strike - premium / shares)) * shares
+        # Call called away: -((diff * shares) - premium); both reduce to premium - diff * shares
+        value = premium - diff * (contracts * 100)
+        value[~itm] = np.nan
+    return diff, itm, value
+
+
+def scenario_grid(valuation, shocks, chunk_size=4096):
+    # Expiration Value of the book with every underlying moved by each shock (0.05 = +5%), summed per ticker.
+    # Positions x shocks is one broadcast of the value_book formulas, in chunks of positions to bound memory;
+    # OTM positions keep their premium. Returns (value, itm_count), tickers x shocks; unquoted tickers are NaN.
+    shocks = np.asarray(shocks, dtype=float)
+    tickers, steps = len(valuation.tickers), len(shocks)
+    value = np.zeros(tickers * steps)
+    itm_count = np.zeros(tickers * steps)
+    cells = np.arange(steps)
+    for start in range(0, len(valuation.ids), chunk_size):
+        rows = slice(start, start + chunk_size)
+        premium = valuation.premium[rows, None]
+        current = valuation.current[rows, None] * (1 + shocks)
+        _, itm, assigned = value_book(valuation.is_call[rows, None], valuation.contracts[rows, None], premium,
+                                      valuation.strike[rows, None], current)
+        index = (valuation.codes[rows, None] * steps + cells).ravel()
+        value += np.bincount(index, weights=np.where(itm, assigned, premium).ravel(), minlength=tickers * steps)
+        itm_count += np.bincount(index, weights=itm.ravel(), minlength=tickers * steps)
+    value = value.reshape(tickers, steps)
+    value[np.isnan(valuation.prices)] = np.nan
+    return value, itm_count.reshape(tickers, steps).astype(int)
+
+
+GREEK_COLUMNS = ("Delta", "Gamma", "Theta", "Vega", "IV")
+MARK_COLUMNS = ("Bid", "Ask", "Mark", "P&L")
+
+
+def norm_cdf(x):
+    # Standard normal CDF through the Abramowitz & Stegun 7.1.26 erf (error < 1.5e-7), so no scipy
+    z = np.abs(x) / math.sqrt(2)
+    t = 1 / (1 + 0.3275911 * z)
+    erf = 1 - t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429)))) * np.exp(-z * z)
+    return 0.5 * (1 + np.where(x < 0, -erf, erf))
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / math.sqrt(2 * math.pi)
+
+
+def black_scholes(is_call, spot, strike, sqrt_t, discount, sigma):
+    # Per-share price, and d1 and the spot density the Greeks reuse
+    vol = sigma * sqrt_t
+    d1 = (np.log(spot / (strike * discount)) + 0.5 * vol * vol) / vol
+    d2 = d1 - vol
+    call = spot * norm_cdf(d1) - strike * discount * norm_cdf(d2)
+    price = np.where(is_call, call, call - spot + strike * discount)  # put through parity
+    return price, d1, d2
+
+
+def implied_vol(is_call, spot, strike, sqrt_t, discount, price, low=1e-4, high=5.0, tolerance=1e-6, iterations=50):
+    # Volatility that reprices each option to price. Newton steps, falling back to bisecting the bracket
+    # whenever a step leaves it or vega is too flat; NaN where no volatility in [low, high] fits.
+    n = len(price)
+    lo = np.full(n, low)
+    hi = np.full(n, high)
+    fits = (black_scholes(is_call, spot, strike, sqrt_t, discount, lo)[0] <= price) & \
+           (price <= black_scholes(is_call, spot, strike, sqrt_t, discount, hi)[0])
+    sigma = np.full(n, 0.3)
+    active = fits.copy()
+    for _ in range(iterations):
+        if not active.any():
+            break
+        rows = np.nonzero(active)[0]
+        s = sigma[rows]
+        model, d1, _ = black_scholes(is_call[rows], spot[rows], strike[rows], sqrt_t[rows], discount[rows], s)
+        error = model - price[rows]
+        hi[rows] = np.where(error > 0, s, hi[rows])
+        lo[rows] = np.where(error > 0, lo[rows], s)
+        vega = spot[rows] * norm_pdf(d1) * sqrt_t[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = s - error / vega
+        inside = (vega > 1e-8) & (step > lo[rows]) & (step < hi[rows])
+        done = np.abs(error) <= tolerance
+        sigma[rows] = np.where(done, s, np.where(inside, step, 0.5 * (lo[rows] + hi[rows])))
+        active[rows] = ~done
+    return np.where(fits, sigma, np.nan)
+
+
+def option_greeks(is_call, spot, strike, years, sqrt_t, discount, rate, price):
+    # IV from the per-share price, then Delta, Gamma, Theta (per calendar day) and Vega (per vol point), per share
+    with np.errstate(invalid='ignore', divide='ignore'):
+        iv = implied_vol(is_call, spot, strike, sqrt_t, discount, price)
+        _, d1, d2 = black_scholes(is_call, spot, strike, sqrt_t, discount, iv)
+        density = norm_pdf(d1)
+        carry = rate * strike * discount
+        decay = -spot * density * iv / (2 * sqrt_t)
+        return {
+            "Delta": np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1),
+            "Gamma": density / (spot * iv * sqrt_t),
+            "Theta": np.where(is_call, decay - carry * norm_cdf(d2), decay + carry * norm_cdf(-d2)) / 365,
+            "Vega": spot * density * sqrt_t / 100,
+            "IV": iv,
+        }
+
+
+class BookValuation:
+    # Positions as column arrays, valued together; index i matches the i-th position iterated
+    def __init__(self, positions, price_cache, greeks=False, rate=0.04):
+        self.positions = list(positions)
+        positions = self.positions
+        self.ids = [position.id for position in positions]
+        self.index = {pid: i for i, pid in enumerate(self.ids)}
+        self.tickers, self.codes = np.unique(np.array([position.ticker for position in positions], dtype=str), return_inverse=True)
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.is_call = np.array([position.option == "Call" for position in positions], dtype=bool)
+        self.contracts = np.array([position.contracts for position in positions], dtype=float)
+        self.premium = np.array([position.premium for position in positions], dtype=float)
+        self.strike = np.array([position.strike for position in positions], dtype=float)
+        self.ends_key = np.array([self._ends_key(position.ends) for position in positions], dtype=float)
+        self.prices = np.full(len(self.tickers), np.nan)
+        self.rate = rate
+        self.greeks = {}
+        self._terms_day = None
+        self.marks = {}
+        self.marks_day = None
+        self.with_greeks = greeks
+        self.set_prices(price_cache)
+
+    def set_prices(self, quotes):
+        # quotes maps ticker -> price; placeholders ("....", "?") count as unknown
+        for ticker, quote in quotes.items():
+            i = self.ticker_index.get(ticker)
+            if i is not None:
+                self.prices[i] = quote if isinstance(quote, (int, float)) else np.nan
+        self.current = self.prices[self.codes]
+        self.diff, self.itm, self.value = value_book(self.is_call, self.contracts, self.premium, self.strike, self.current)
+        if self.with_greeks:
+            self._update_greeks(quotes)
+
+    def set_greeks(self, enabled):
+        self.with_greeks = enabled
+        self.greeks = {}
+        if enabled:
+            self._update_greeks(None)
+
+    def _update_greeks(self, quotes):
+        # Only the positions on re-quoted tickers are solved again; quotes None, or a new day, redoes the book
+        today = datetime.now(MarketCalendar.TZ).date()
+        if today != self._terms_day or not self.greeks:
+            self._expiry_terms(today)
+            self.greeks = {col: np.full(len(self.ids), np.nan) for col in GREEK_COLUMNS}
+            quotes = None
+        if quotes is None:
+            rows = np.arange(len(self.ids))
+        else:
+            codes = [self.ticker_index[t] for t in quotes if t in self.ticker_index]
+            rows = np.nonzero(np.isin(self.codes, codes))[0]
+        if not len(rows):
+            return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            price = self.premium[rows] / (self.contracts[rows] * 100)
+        values = option_greeks(self.is_call[rows], self.current[rows], self.strike[rows], self.years[rows],
+                               self.sqrt_t[rows], self.discount[rows], self.rate, price)
+        for col, column in values.items():
+            self.greeks[col][rows] = column
+
+    def _expiry_terms(self, today):
+        # Time to expiry, its square root and the discount factor depend only on Ends: worked out once
+        # per distinct expiry for the day. Expiry day counts as half a day; expired positions get NaN.
+        keys, inverse = np.unique(self.ends_key, return_inverse=True)
+        years = np.full(len(keys), np.nan)
+        for i, key in enumerate(keys.tolist()):
+            expiry = expiry_date(int(key) // 100, int(key) % 100, today)
+            if expiry is not None and expiry >= today:
+                years[i] = max((expiry - today).days, 0.5) / 365
+        self.years = years[inverse]
+        self.sqrt_t = np.sqrt(years)[inverse]
+        self.discount = np.exp(-self.rate * years)[inverse]
+        self._terms_day = today
+
+    def chain_pairs(self, today):
+        # The distinct (ticker, expiry date) pairs in the book, one option chain each; expiry is None for
+        # a blank or invalid Ends. Worked out once per day, which also clears marks from the day before.
+        if self.marks_day != today:
+            keys, self.pair_index = np.unique(self.codes * 10000 + self.ends_key.astype(np.intp), return_inverse=True)
+            self.pairs = []
+            for key in keys.tolist():
+                code, ends = divmod(key, 10000)
+                self.pairs.append((str(self.tickers[code]), expiry_date(ends // 100, ends % 100, today)))
+            self.pair_numbers = {pair: i for i, pair in enumerate(self.pairs)}
+            self.pair_rows = np.argsort(self.pair_index, kind='stable')
+            self.pair_bounds = np.searchsorted(self.pair_index[self.pair_rows], np.arange(len(self.pairs) + 1))
+            self.marks = {col: np.full(len(self.ids), np.nan) for col in MARK_COLUMNS}
+            self.marks_day = today
+        return self.pairs
+
+    def clear_marks(self):
+        self.marks = {}
+        self.marks_day = None
+
+    def set_marks(self, pair, table):
+        # Bid/Ask/Mark per share from pair's chain table, and P&L of the written position at that mark:
+        # premium received less the cost to buy it back now. Mark is the mid, or the last trade without a market.
+        number = self.pair_numbers.get(pair)
+        if number is None or not self.marks:
+            return
+        rows = self.pair_rows[self.pair_bounds[number]:self.pair_bounds[number + 1]]
+        quotes = np.array([table.get((is_call, strike), (np.nan,) * 3) for is_call, strike in
+                           zip(self.is_call[rows].tolist(), self.strike[rows].tolist())], dtype=float).reshape(-1, 3)
+        bid, ask, last = quotes.T
+        mark = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, last)
+        self.marks["Bid"][rows] = bid
+        self.marks["Ask"][rows] = ask
+        self.marks["Mark"][rows] = mark
+        self.marks["P&L"][rows] = self.premium[rows] - mark * self.contracts[rows] * 100
+
+    def outcome(self, i):
+        if not self.itm[i]:
+            return ""
+        return "Sell" if self.is_call[i] else "Purchase"
+
+    @staticmethod
+    def _ends_key(ends):
+        # M/D as a sortable number; blank or malformed dates sort last
+        try:
+            month, day = map(int, ends.split('/'))
+            return month * 100 + day
+        except ValueError:
+            return 9999
+
+
+class SortIndex:
+    # Display order (valuation indices) for one column, kept beside the model so the saved order never changes.
+    # Ties break on ticker. Price columns are re-keyed per ticker and merged back in as quotes arrive.
+    PRICE_COLUMNS = ("Current", "Diff", "Outcome", "Value") + GREEK_COLUMNS + MARK_COLUMNS
+
+    def __init__(self, col, reverse):
+        self.col = col
+        self.reverse = reverse
+        self.order = np.array([], dtype=np.intp)
+
+    def build(self, valuation):
+        self.codes = valuation.codes
+        self.keys = self._keys(valuation, slice(None))
+        self.order = np.lexsort((self.codes, self.keys))
+
+    def update(self, valuation, tickers):
+        # Returns True if the order may have changed
+        if self.col not in self.PRICE_COLUMNS:
+            return False
+        codes = [valuation.ticker_index[t] for t in tickers if t in valuation.ticker_index]
+        if not codes:
+            return False
+        moved_mask = np.isin(self.codes, codes)
+        moved = np.nonzero(moved_mask)[0]
+        self.keys[moved] = self._keys(valuation, moved)
+        if len(moved) * 8 > len(self.order):
+            self.order = np.lexsort((self.codes, self.keys))
+            return True
+
+        rest = self.order[~moved_mask[self.order]]
+        moved = moved[np.lexsort((self.codes[moved], self.keys[moved]))]
+        rest_keys = self.keys[rest]
+        rest_codes = self.codes[rest]
+        moved_keys = self.keys[moved]
+        positions = np.searchsorted(rest_keys, moved_keys, side='left')
+        ends = np.searchsorted(rest_keys, moved_keys, side='right')
+        for i in np.nonzero(ends > positions)[0]:  # equal keys: place by ticker within the run
+            positions[i] += np.searchsorted(rest_codes[positions[i]:ends[i]], self.codes[moved[i]])
+        self.order = np.insert(rest, positions, moved)
+        return True
+
+    def display_order(self):
+        return self.order[::-1] if self.reverse else self.order
+
+    def _keys(self, valuation, rows):
+        col = self.col
+        if col == "Ticker":
+            key = valuation.codes[rows]
+        elif col == "Ends":
+            key = valuation.ends_key[rows]
+        elif col == "Option":
+            key = ~valuation.is_call[rows]  # Call before Put
+        elif col == "Contracts":
+            key = valuation.contracts[rows]
+        elif col == "Premium":
+            key = valuation.premium[rows]
+        elif col == "Strike":
+            key = valuation.strike[rows]
+        elif col == "Current":
+            key = valuation.current[rows]
+        elif col == "Diff":
+            key = valuation.diff[rows]
+        elif col == "Value":
+            key = valuation.value[rows]
+        elif col == "Outcome":
+            # "" < "Purchase" < "Sell"
+            key = np.where(valuation.itm[rows], np.where(valuation.is_call[rows], 2.0, 1.0), 0.0)
+        elif col in valuation.greeks:
+            key = valuation.greeks[col][rows]
+        elif col in valuation.marks:
+            key = valuation.marks[col][rows]
+        else:
+            key = valuation.codes[rows]
+        key = np.asarray(key, dtype=float)
+        return np.where(np.isnan(key), np.inf, key)  # no quote yet: sort last
+
+
+class AlertEngine:
+    # User alerts on positions: goes ITM (itm), trades within near dollars of its strike, Value below -value_below.
+    # Every rule flips at a price level per position. Levels are kept sorted per ticker, so a quote moving
+    # from old to new only re-checks the positions with a level in between (two searchsorted calls).
+    # active maps valuation row -> rules firing; update() returns the rows that just started firing.
+    def __init__(self, itm=False, near=None, value_below=None):
+        self.itm = itm
+        self.near = near
+        self.value_below = value_below
+        self.active = {}
+
+    def settings(self):
+        return {"itm": self.itm, "near": self.near, "value_below": self.value_below}
+
+    def build(self, valuation):
+        # Index valuation's positions and take their current state as the starting point (nothing fires)
+        rows = np.arange(len(valuation.ids))
+        levels, level_rows = [], []
+        if self.itm:
+            levels.append(valuation.strike)
+        if self.near is not None:
+            levels += [valuation.strike - self.near, valuation.strike + self.near]
+        if self.value_below is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # premium - diff * shares < -value_below  <=>  diff > (premium + value_below) / shares
+                move = (valuation.premium + self.value_below) / (valuation.contracts * 100)
+            levels.append(np.where(valuation.is_call, valuation.strike + move, valuation.strike - move))
+        level_rows = [rows] * len(levels)
+        levels = np.concatenate(levels) if levels else np.array([])
+        level_rows = np.concatenate(level_rows) if level_rows else np.array([], dtype=np.intp)
+        level_codes = valuation.codes[level_rows]
+        order = np.lexsort((levels, level_codes))
+        self.levels = levels[order]
+        self.level_rows = level_rows[order]
+        self.level_bounds = np.searchsorted(level_codes[order], np.arange(len(valuation.tickers) + 1))
+        order = np.argsort(valuation.codes, kind='stable')
+        self.ticker_rows = order
+        self.row_bounds = np.searchsorted(valuation.codes[order], np.arange(len(valuation.tickers) + 1))
+        self.last_prices = np.full(len(valuation.tickers), np.nan)
+        self.active = {}
+        self.update(valuation, valuation.tickers.tolist())
+        return self
+
+    def update(self, valuation, tickers):
+        # Call after valuation.set_prices with the tickers that were re-quoted
+        candidates = []
+        for ticker in tickers:
+            code = valuation.ticker_index.get(ticker)
+            if code is None:
+                continue
+            new, old = valuation.prices[code], self.last_prices[code]
+            if math.isnan(new):
+                continue  # no quote: leave the alerts as they were
+            if math.isnan(old):
+                candidates.append(self.ticker_rows[self.row_bounds[code]:self.row_bounds[code + 1]])
+            elif new != old:
+                start, end = self.level_bounds[code], self.level_bounds[code + 1]
+                levels = self.levels[start:end]
+                low, high = (old, new) if old < new else (new, old)
+                candidates.append(self.level_rows[start + np.searchsorted(levels, low, 'left'):
+                                                  start + np.searchsorted(levels, high, 'right')])
+            self.last_prices[code] = new
+        if not candidates:
+            return []
+        rows = np.unique(np.concatenate(candidates))
+        return self._check(valuation, rows)
+
+    def _check(self, valuation, rows):
+        firing = np.zeros((len(rows), 3), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if self.itm:
+                firing[:, 0] = valuation.itm[rows]
+            if self.near is not None:
+                firing[:, 1] = np.abs(valuation.current[rows] - valuation.strike[rows]) <= self.near
+            if self.value_below is not None:
+                firing[:, 2] = valuation.value[rows] < -self.value_below
+        fired = []
+        for row, flags in zip(rows.tolist(), firing.tolist()):
+            rules = tuple(rule for rule, on in zip(("ITM", "near strike", "value"), flags) if on)
+            previous = self.active.pop(row, ())
+            if rules:
+                self.active[row] = rules
+                if set(rules) - set(previous):
+                    fired.append(row)
+        return fired
+
 
 class OptionsMonitor:
+    QUOTE_BATCH_SIZE = 100  # tickers per bulk download request
+    FETCH_WORKERS = 8       # concurrent per-ticker lookups
+    QUOTE_SOURCE = "yahoo"  # "yahoo", or "replay" for offline quotes (replay.csv next to data.csv if present, else synthetic)
+    RENDER_DELAY_MS = 16    # updates within one frame are merged into a single repaint
+    POST_POLL_MS = 20       # how often the Tk thread picks up results handed over by worker threads
+    VIRTUAL_THRESHOLD = 2000  # above this many rows only the viewport (plus buffer) gets Treeview items
+    VIRTUAL_BUFFER = 50       # rows materialized above and below the viewport in virtual mode
+    STORAGE = "csv"           # "csv" rewrites data.csv on every change, "sqlite" keeps the book in data.db
+    RISK_FREE_RATE = 0.04     # annual, continuously compounded, for the Greeks columns
+    CHAIN_TTL = 5 * 60        # seconds an option chain is reused for the Marks columns
+    CHAIN_WORKERS = 4         # concurrent option chain fetches
+    SCENARIO_SHOCKS = np.round(np.arange(-20, 21) / 100, 2)  # underlying moves in the Scenarios grid
+    SCENARIO_ROWS = 250       # tickers drawn in the Scenarios grid, largest worst-case loss first
+    REFRESH_INTERVALS = {"5 Mins": 5 * 60, "10 Mins": 10 * 60, "15 Mins": 15 * 60, "30 Mins": 30 * 60,
+                         "1 Hour": 60 * 60, "2 Hours": 2 * 60 * 60}  # seconds
+    ADAPTIVE = "Adaptive"       # refresh near-the-money tickers often and distant ones rarely
+    ADAPTIVE_BUDGET = 60        # ticker lookups per minute in Adaptive mode
+    ADAPTIVE_TICK = 15          # seconds between Adaptive scheduling passes
+    ADAPTIVE_MIN = 60           # fastest / slowest per-ticker refresh in Adaptive mode, seconds
+    ADAPTIVE_MAX = 60 * 60
+    MAX_TIMER = 60 * 60  # longest single wait, so a suspended PC re-checks the calendar soon after waking
+    METRICS_INTERVAL = 60  # seconds between writes of metrics.json
+    DATA_FILE = r"C:\ProgramData\ShadowWhisperer\OptionsMonitor\data.csv"
+
     def __init__(self, root):
         self.root = root
-        self.root.title("Options Monitor  1.9")
-        self.data_file = r"C:\ProgramData\ShadowWhisperer\OptionsMonitor\data.csv"
+        self.root.title(f"Options Monitor  {VERSION}")
+        self.data_file = self.DATA_FILE
+        self.calendar = MarketCalendar()
+        self._market_timer = None
+        self.quote_cache_file = os.path.join(os.path.dirname(self.data_file), "quotes.json")
+        self.alerts_file = os.path.join(os.path.dirname(self.data_file), "alerts.json")
+        self.db_file = os.path.join(os.path.dirname(self.data_file), "data.db")
+        self.metrics_file = os.path.join(os.path.dirname(self.data_file), "metrics.json")
+        self.DevMode = 0
+        self.setup_logging()
         self.data = self.load_data()
         self.price_cache = {}
+        self.quote_times = {}
+        self.stale_tickers = set()
+        self._quote_save_job = None
         self.sort_reverse = {}
         self.last_market_status = None
         self.refresh_interval = None
         self.last_interval = "15 Mins"
         self.last_updated_label = None
-        self.DevMode = 0
         self.current_sort_col = None
         self.current_sort_reverse = False
+        self.sort_index = None
+        self.show_greeks = False
+        self.show_marks = False
+        self._posted = SimpleQueue()
+        self._closed = False
+        self.quote_provider = self.make_quote_provider()
+        self.chains = OptionChainCache(self.quote_provider, self.CHAIN_TTL, self.CHAIN_WORKERS)
+        self.fetcher = FetchCoordinator(self.quote_provider, lambda quotes, seq: self._post(self._apply_quotes, quotes, seq),
+                                        batch_size=self.QUOTE_BATCH_SIZE)
+        self._quote_seq = {}
+        self._adaptive_attempts = {}
+        self._refresh_running = False
+        self._rendered = {}
+        self._item_rows = {}
+        self._ticker_items = {}
+        self._iids = []
+        self._window_rows = {}
+        self._dirty_tickers = set()
+        self._render_all = False
+        self._render_job = None
+        self._valuation_version = None
+        self._view = []
+        self._virtual = False
+        self._view_offset = 0
+        self._window_start = 0
+        self._window_len = 0
+        self._window_job = None
+        self.load_quote_cache()
+        self.alerts = self.load_alerts()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._import_running = False
         self.setup_gui()
         self.populate_treeview()
-        threading.Thread(target=self.fetch_initial_prices, daemon=True).start()
+        self._post_job = self.root.after(self.POST_POLL_MS, self._drain_posted)
+        self.root.after_idle(self._startup_done)  # fetch once the window has been drawn
+        self._metrics_job = self.root.after(self.METRICS_INTERVAL * 1000, self.save_metrics)
+        self._awaiting_first_quotes = True
+        if self.load_report.rejected:
+            # Shown from the event loop, not from __init__ before mainloop() has started
+            self.root.after(0, messagebox.showwarning, "Warning",
+                            self.load_report.summary() + "\nRejected rows are dropped on the next save.")
 
     def load_data(self):
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        try:
-            with open(self.data_file, 'r', newline='') as f:
-                reader = csv.reader(f)
-                data = []
-                for row in reader:
-                    if not row or row[0] == "Ticker":  # skip header if present
-                        continue
-                    try:
-                        if len(row) == 6:
-                            data.append([row[0], row[1], row[2], int(row[3]), float(row[4]), float(row[5])])
-                        elif len(row) == 5:
-                            data.append([row[0], row[1], row[2], int(row[3]), 0.0, float(row[4])])
-                    except ValueError:
-                        continue
-                return data
-        except FileNotFoundError:
-            return []
+        if self.STORAGE == "sqlite":
+            self.storage = SqliteStorage(self.db_file, csv_path=self.data_file)
+        else:
+            self.storage = CsvStorage(self.data_file)
+        self.load_report = ImportReport()
+        return self.storage.load(self.load_report)
 
     def save_data(self):
-        # Write header then data rows (header will be ignored on load)
+        self.storage.save(self.data)
+
+    def import_csv(self):
+        path = filedialog.askopenfilename(title="Import", filetypes=[("CSV", "*.csv"), ("All files", "*.*")])
+        if not path or self._import_running:
+            return
+        self._import_running = True
+        report = ImportReport()
+
+        # Parse on a worker thread; chunks are added to the book on the Tk thread as they arrive
+        def worker():
+            try:
+                for columns, progress in stream_positions_csv(path, report):
+                    self._post(self._import_chunk, columns, progress)
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                report.error = str(e)
+            self._post(self._import_done, report)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _import_chunk(self, columns, progress):
+        self.data.extend(*columns)
+        self.status_label.config(text=f"Importing {progress:.0%}")
+
+    def _import_done(self, report):
+        self._import_running = False
+        self.status_label.config(text="")
+        if report.accepted:
+            self.save_data()
+            self.populate_treeview()
+            self.fetch_initial_prices()
+        message = report.summary()
+        if report.rejected:
+            report_file = os.path.join(os.path.dirname(self.data_file), "import_rejected.csv")
+            report.write(report_file)
+            message += f"\nDetails: {report_file}"
+        if report.rejected or report.error or not report.accepted:
+            messagebox.showwarning("Import", message)
+        else:
+            messagebox.showinfo("Import", message)
+
+    def export_csv(self):
+        path = filedialog.asksaveasfilename(title="Export", defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if path:
+            write_positions_csv(path, self.data)
+
+    def load_quote_cache(self):
+        # Last known quotes, so the table renders right away; old or market-hours values are marked stale
+        try:
+            with open(self.quote_cache_file, 'r') as f:
+                cached = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        # Fresh only while the market is closed and the quote was taken after the last close: those prices
+        # cannot change before the next open, whether that is overnight, a weekend or a holiday
+        market_open = self.is_market_open()
+        last_close = self.calendar.last_close(datetime.now(MarketCalendar.TZ)).timestamp()
+        for ticker, entry in cached.items():
+            try:
+                price, fetched = float(entry["price"]), float(entry["time"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.price_cache[ticker] = price
+            self.quote_times[ticker] = fetched
+            if market_open or fetched < last_close:
+                self.stale_tickers.add(ticker)
+
+    def load_alerts(self):
+        try:
+            with open(self.alerts_file, 'r') as f:
+                settings = json.load(f)
+            return AlertEngine(bool(settings.get("itm")), settings.get("near"), settings.get("value_below"))
+        except (FileNotFoundError, ValueError, AttributeError):
+            return AlertEngine()
+
+    def save_alerts(self):
+        os.makedirs(os.path.dirname(self.alerts_file), exist_ok=True)
+        with atomic_write(self.alerts_file) as f:
+            json.dump(self.alerts.settings(), f)
+
+    def edit_alerts(self):
+        window = tk.Toplevel(self.root)
+        window.title("Alerts")
+        window.resizable(False, False)
+        form_frame = tk.Frame(window)
+        form_frame.pack(pady=6, padx=6)
+
+        itm_var = tk.BooleanVar(value=self.alerts.itm)
+        tk.Checkbutton(form_frame, text="Goes ITM", variable=itm_var).grid(row=0, column=0, columnspan=2, sticky="w", pady=4)
+        tk.Label(form_frame, text="Within $ of strike").grid(row=1, column=0, sticky="e", padx=4, pady=4)
+        near_entry = tk.Entry(form_frame, width=10)
+        near_entry.insert(0, "" if self.alerts.near is None else f"{self.alerts.near:g}")
+        near_entry.grid(row=1, column=1, pady=4)
+        tk.Label(form_frame, text="Value below -").grid(row=2, column=0, sticky="e", padx=4, pady=4)
+        value_entry = tk.Entry(form_frame, width=10)
+        value_entry.insert(0, "" if self.alerts.value_below is None else f"{self.alerts.value_below:g}")
+        value_entry.grid(row=2, column=1, pady=4)
+
+        def submit():
+            try:
+                near = float(near_entry.get()) if near_entry.get().strip() else None
+                value_below = float(value_entry.get()) if value_entry.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Error", "Check the amounts, or leave them empty.", parent=window)
+                return
+            self.alerts = AlertEngine(itm_var.get(), near, value_below).build(self.valuation)
+            self.save_alerts()
+            self.populate_treeview()
+            window.destroy()
+        tk.Button(window, text="Save", command=submit, width=12).pack(pady=8)
+
+    def _notify_alerts(self, rows):
+        if not rows:
+            return
+        for row in rows:
+            position = self.valuation.positions[row]
+            log.info("Alert: %s %s %s %g, %s at %s", position.ticker, position.ends, position.option, position.strike,
+                     ", ".join(self.alerts.active[row]), self.price_cache.get(position.ticker))
+        position = self.valuation.positions[rows[0]]
+        more = f" (+{len(rows) - 1} more)" if len(rows) > 1 else ""
+        self.status_label.config(text=f"Alert: {position.ticker} {position.ends} {position.option} {position.strike:g} "
+                                      f"{', '.join(self.alerts.active[rows[0]])}{more}")
+        self.root.bell()
+
+    def save_quote_cache(self):
+        self._quote_save_job = None
+        cached = {ticker: {"price": self.price_cache[ticker], "time": fetched}
+                  for ticker, fetched in self.quote_times.items()
+                  if isinstance(self.price_cache.get(ticker), (int, float))}
+        os.makedirs(os.path.dirname(self.quote_cache_file), exist_ok=True)
+        with atomic_write(self.quote_cache_file) as f:
+            json.dump(cached, f)
+
+    def setup_logging(self):
+        # OptionsMonitor.log next to data.csv, rolled over at 1 MB; DevMode adds every lookup
+        if log.handlers:
+            return
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Ticker", "Ends", "Option", "Contracts", "Premium", "Strike"])
-            for row in self.data:
-                writer.writerow([
-                    row[0],
-                    row[1],
-                    row[2],
-                    str(row[3]),
-                    str(row[4]),
-                    str(row[5])
-                ])
+        handler = RotatingFileHandler(os.path.join(os.path.dirname(self.data_file), "OptionsMonitor.log"),
+                                      maxBytes=1024 * 1024, backupCount=3, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+        log.addHandler(handler)
+        log.setLevel(logging.DEBUG if self.DevMode == 1 else logging.INFO)
+
+    def _startup_done(self):
+        elapsed = time_module.perf_counter() - STARTED
+        metrics.record("startup.window", elapsed)
+        log.info("Startup: window shown after %.2fs with %d positions", elapsed, len(self.data))
+        self.fetch_initial_prices()
+
+    def save_metrics(self, reschedule=True):
+        if reschedule:
+            self._metrics_job = self.root.after(self.METRICS_INTERVAL * 1000, self.save_metrics)
+        try:
+            metrics.write(self.metrics_file)
+        except OSError as e:
+            log.warning("Metrics: Failed to write %s, Error: %s", self.metrics_file, e)
+
+    def show_stats(self):
+        # Rolling percentiles and counters, refreshed every second while the window is open
+        window = tk.Toplevel(self.root)
+        window.title("Stats")
+        window.geometry("520x320")
+        cols = ("Metric", "Count", "p50", "p90", "p99", "Max")
+        tree = ttk.Treeview(window, columns=cols, show="headings")
+        for col in cols:
+            tree.heading(col, text=col, anchor="w")
+            tree.column(col, width=160 if col == "Metric" else 60, anchor="w")
+        tree.pack(fill="both", expand=True, pady=2)
+
+        def update():
+            if not window.winfo_exists():
+                return
+            snapshot = metrics.snapshot()
+            tree.delete(*tree.get_children())
+            for name, timing in snapshot["timings"].items():
+                tree.insert("", "end", values=(name, timing["count"]) + tuple(
+                    f"{timing[key] * 1000:.1f} ms" for key in ("p50", "p90", "p99", "max")))
+            for name, count in snapshot["counters"].items():
+                tree.insert("", "end", values=(name, count, "", "", "", ""))
+            window.after(1000, update)
+        update()
 
     def setup_gui(self):
         self.root.grid_rowconfigure(0, weight=1)
@@ -71,8 +1574,9 @@ class OptionsMonitor:
         self.root.grid_rowconfigure(2, weight=0)
         self.root.grid_columnconfigure(0, weight=1)
 
-        cols = ("Ticker", "Ends", "Option", "Contracts", "Premium", "Strike", "Current", "Diff", "Outcome", "Value")
-        self.tree = ttk.Treeview(self.root, columns=cols, show="headings")
+        cols = ("Ticker", "Ends", "Option", "Contracts", "Premium", "Strike", "Current", "Diff", "Outcome", "Value") + GREEK_COLUMNS + MARK_COLUMNS
+        self.base_columns = cols[:-len(GREEK_COLUMNS + MARK_COLUMNS)]
+        self.tree = ttk.Treeview(self.root, columns=cols, displaycolumns=self.base_columns, show="headings")
         for col in cols:
             width = 20
             self.tree.heading(col, text=col, command=lambda c=col: self.sort_column(c), anchor="w")
@@ -82,13 +1586,29 @@ class OptionsMonitor:
         self.tree.tag_configure('oddrow', background='#f0f0f0')
         self.tree.tag_configure('evenrow', background='#ffffff')
         self.tree.tag_configure('redrow', background='#ffcccc')
+        self.tree.tag_configure('alert', background='#ffe8a0')
         self.tree.tag_configure('green_diff', foreground='green')
         self.tree.tag_configure('red_diff', foreground='red')
+        self.tree.tag_configure('stale', foreground='#808080')
         self.tree.grid(row=0, column=0, pady=2, sticky="nsew")
         self.tree.bind("<Double-1>", self.on_double_click)
+        self.tree.bind("<Button-3>", self.show_menu)
+
+        self.menu = tk.Menu(self.root, tearoff=0)
+        self.menu.add_command(label="Import CSV...", command=self.import_csv)
+        self.menu.add_command(label="Export CSV...", command=self.export_csv)
+        self.menu.add_separator()
+        self.menu.add_command(label="Scenarios...", command=self.show_scenarios)
+        self.menu.add_command(label="Alerts...", command=self.edit_alerts)
+        self.menu.add_command(label="Stats...", command=self.show_stats)
+        self.tree.bind("<Configure>", lambda event: self._virtual and self._render_window())
+
+        self.scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, pady=2, sticky="ns")
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll)
 
         button_frame = tk.Frame(self.root, height=30)
-        button_frame.grid(row=1, column=0, pady=2, sticky="ew")
+        button_frame.grid(row=1, column=0, columnspan=2, pady=2, sticky="ew")
         self.refresh_button = tk.Button(button_frame, text="Refresh", command=self.refresh_data, width=10)
         self.refresh_button.pack(side="left", padx=(15, 5))
         tk.Button(button_frame, text="Add", command=self.add_option, width=10).pack(side="left", padx=(10, 5))
@@ -102,7 +1622,7 @@ class OptionsMonitor:
         self.interval_combo = ttk.Combobox(
             button_frame,
             textvariable=self.interval_var,
-            values=["Don't Update", "5 Mins", "10 Mins", "15 Mins", "30 Mins", "1 Hour", "2 Hours"],
+            values=["Don't Update", self.ADAPTIVE] + list(self.REFRESH_INTERVALS),
             width=16, state="readonly"
         )
         self.interval_combo.pack(side="right", padx=(0, 0))
@@ -112,13 +1632,20 @@ class OptionsMonitor:
         style.configure("Red.TCombobox", foreground="red")
         style.map("Red.TCombobox", foreground=[("disabled", "red")])
 
+        self.greeks_var = tk.BooleanVar(value=self.show_greeks)
+        tk.Checkbutton(button_frame, text="Greeks", variable=self.greeks_var, command=self.toggle_greeks).pack(side="right", padx=(1, 10))
+        self.marks_var = tk.BooleanVar(value=self.show_marks)
+        tk.Checkbutton(button_frame, text="Marks", variable=self.marks_var, command=self.toggle_marks).pack(side="right", padx=(1, 1))
+
         self.filter_var = tk.StringVar(value="All")
         tk.Radiobutton(button_frame, text="Puts", variable=self.filter_var, value="Put", command=self.populate_treeview).pack(side="right", padx=(1, 1))
         tk.Radiobutton(button_frame, text="Calls", variable=self.filter_var, value="Call", command=self.populate_treeview).pack(side="right", padx=(1, 1))
         tk.Radiobutton(button_frame, text="All", variable=self.filter_var, value="All", command=self.populate_treeview).pack(side="right", padx=(1, 1))
 
         self.status_frame = tk.Frame(self.root)
-        self.status_frame.grid(row=2, column=0, sticky="ew")
+        self.status_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
+        self.status_label = tk.Label(self.status_frame, text="")
+        self.status_label.pack(side="left", padx=(15, 5))
 
         self.update_market_status()
         self.schedule_refresh()
@@ -126,20 +1653,18 @@ class OptionsMonitor:
     def is_market_open(self):
         if self.DevMode == 1:
             return True
-        now = datetime.now(pytz.timezone('US/Eastern'))
-        return now.weekday() < 5 and time(9, 30) <= now.time() <= time(16, 0)
+        return self.calendar.is_open(datetime.now(MarketCalendar.TZ))
 
     def update_market_status(self):
-        now = datetime.now(pytz.timezone('US/Eastern'))
+        # Runs at each open/close transition from the calendar (one timer, no polling)
+        self._market_timer = None
+        now = datetime.now(MarketCalendar.TZ)
         is_open = self.is_market_open()
-        market_open_time = datetime.combine(now.date(), time(9, 30)).replace(tzinfo=pytz.timezone('US/Eastern'))
-        time_to_open = (market_open_time - now).total_seconds()
-        is_near_open = 0 <= time_to_open <= 300
 
         if self.last_market_status != is_open:
             self.refresh_button.config(state="normal" if is_open else "disabled")
             if is_open:
-                self.interval_combo.config(values=["Don't Update", "5 Mins", "10 Mins", "15 Mins", "30 Mins", "1 Hour", "2 Hours"], state="readonly", style="TCombobox")
+                self.interval_combo.config(values=["Don't Update", self.ADAPTIVE] + list(self.REFRESH_INTERVALS), state="readonly", style="TCombobox")
                 self.interval_var.set(self.last_interval)
                 self.schedule_refresh()
             else:
@@ -152,7 +1677,11 @@ class OptionsMonitor:
                 self.refresh_data()
             self.last_market_status = is_open
 
-        self.root.after(30000 if is_near_open else 10000, self.update_market_status)
+        if self.DevMode == 1:
+            return
+        next_change, _ = self.calendar.next_transition(now)
+        delay = min((next_change - now).total_seconds() + 1, self.MAX_TIMER)  # land just after the transition
+        self._market_timer = self.root.after(int(delay * 1000), self.update_market_status)
 
     def schedule_refresh(self, event=None):
         if self.refresh_interval is not None:
@@ -161,25 +1690,38 @@ class OptionsMonitor:
             self.refresh_interval = None
 
         interval = self.interval_var.get()
-        if interval == "Don't Update" or interval == "Markets Closed":
+        if interval == self.ADAPTIVE:
+            self.last_interval = interval
+
+            def adaptive_tick():
+                self.refresh_interval = None
+                if self.is_market_open():
+                    self.refresh_adaptive()
+                self.schedule_next_refresh(self.ADAPTIVE_TICK, adaptive_tick)
+
+            self.schedule_next_refresh(self.ADAPTIVE_TICK, adaptive_tick)
+            return
+        if interval not in self.REFRESH_INTERVALS:  # "Don't Update" / "Markets Closed"
             return
 
         self.last_interval = interval
-        try:
-            if "Hour" in interval:
-                ms = int(interval.replace(" Hour", "").replace("s", "")) * 60 * 60 * 1000
-            else:
-                ms = int(interval.replace(" Mins", "")) * 60 * 1000
-        except ValueError:
-            return
+        seconds = self.REFRESH_INTERVALS[interval]
 
         def refresh_if_open():
+            self.refresh_interval = None
             if self.is_market_open():
-                self._just_refreshed = True
                 self.refresh_data()
-            self.refresh_interval = self.root.after(ms, refresh_if_open)
+            self.schedule_next_refresh(seconds, refresh_if_open)
 
-        self.refresh_interval = self.root.after(ms, refresh_if_open)
+        self.schedule_next_refresh(seconds, refresh_if_open)
+
+    def schedule_next_refresh(self, seconds, callback):
+        # Only within today's session; the close transition does the last refresh and the open one restarts this
+        now = datetime.now(MarketCalendar.TZ)
+        session = self.calendar.session(now.date())
+        if self.DevMode != 1 and (session is None or now + timedelta(seconds=seconds) >= session[1]):
+            return
+        self.refresh_interval = self.root.after(seconds * 1000, callback)
 
     def add_option(self):
         add_window = tk.Toplevel(self.root)
@@ -243,242 +1785,481 @@ class OptionsMonitor:
             return
         if ticker and call_put in ["Call", "Put"]:
             try:
-                new_row = [ticker, close_date, call_put, int(contracts), float(premium), float(strike_price)]
-                self.data.append(new_row)
+                position = self.data.add(ticker, close_date, call_put, int(contracts), float(premium), float(strike_price))
                 self.populate_treeview()
-                self.save_data()
-                threading.Thread(target=self.fetch_initial_prices, daemon=True).start()
+                self.storage.insert(self.data, position)
+                self.fetch_initial_prices(priority=True)
                 window.destroy()
             except ValueError:
                 messagebox.showerror("Error", "Check Contracts, Premium & Strike.")
         else:
             messagebox.showerror("Error", "Invalid Ticker.")
 
-    def fetch_initial_prices(self):
-        unique_tickers = {row[0] for row in self.data if len(row) == 6}
-        for ticker in unique_tickers:
-            if ticker not in self.price_cache or self.price_cache[ticker] in ["....", "?"]:
-                self.price_cache[ticker] = "...."
-                for attempt in range(3):
-                    try:
-                        yf_ticker = yf.Ticker(ticker)
-                        quote = yf_ticker.get_info().get('regularMarketPrice', None)
-                        if quote is None or (isinstance(quote, float) and math.isnan(quote)):
-                            history = yf_ticker.history(period="1d")
-                            quote = round(history["Close"].iloc[-1], 2) if not history.empty and not math.isnan(history["Close"].iloc[-1]) else None
-                        self.price_cache[ticker] = quote if quote is not None and not math.isnan(quote) else "?"
-                        if self.DevMode == 1:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Lookup {ticker}: {self.price_cache[ticker]}")
-                        break
-                    except Exception as e:
-                        if self.DevMode == 1:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Lookup {ticker}: Failed, Error: {str(e)}")
-                        if attempt < 2:
-                            time_module.sleep(1)
-                        self.price_cache[ticker] = "?"
-                self.root.after(0, self.populate_treeview)
+    def show_scenarios(self):
+        # Heatmap of expiration Value per ticker (rows) against a move in the underlying (columns), from current prices
+        if self._valuation_version != self.data.version:
+            self.populate_treeview()
+        shocks = self.SCENARIO_SHOCKS
+        value, itm_count = scenario_grid(self.valuation, shocks)
+        positions = np.bincount(self.valuation.codes, minlength=len(self.valuation.tickers))
+        quoted = np.nonzero(~np.isnan(self.valuation.prices))[0]
+        if not len(quoted):
+            messagebox.showinfo("Scenarios", "No prices yet.")
+            return
+        order = quoted[np.argsort(np.min(value[quoted], axis=1), kind='stable')]
+        labels = ["Total"] + [self.valuation.tickers[i] for i in order[:self.SCENARIO_ROWS]]
+        rows = np.vstack([value[quoted].sum(axis=0), value[order[:self.SCENARIO_ROWS]]])
+        itm_rows = np.vstack([itm_count[quoted].sum(axis=0), itm_count[order[:self.SCENARIO_ROWS]]])
+        position_rows = [int(positions[quoted].sum())] + positions[order[:self.SCENARIO_ROWS]].tolist()
+        prices = [None] + self.valuation.prices[order[:self.SCENARIO_ROWS]].tolist()  # the snapshot the grid was built from
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Scenarios  {datetime.now().strftime('%I:%M %p').lstrip('0')}")
+        window.geometry("740x365")
+        window.grid_rowconfigure(0, weight=1)
+        window.grid_columnconfigure(0, weight=1)
+        canvas = tk.Canvas(window, background="#ffffff", highlightthickness=0)
+        canvas.grid(row=0, column=0, sticky="nsew")
+        y_scroll = ttk.Scrollbar(window, orient="vertical", command=canvas.yview)
+        y_scroll.grid(row=0, column=1, sticky="ns")
+        x_scroll = ttk.Scrollbar(window, orient="horizontal", command=canvas.xview)
+        x_scroll.grid(row=1, column=0, sticky="ew")
+        canvas.configure(yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
+        status = tk.Label(window, text="", anchor="w")
+        status.grid(row=2, column=0, columnspan=2, sticky="ew", padx=(15, 5))
+        if len(quoted) > self.SCENARIO_ROWS:
+            status.config(text=f"Showing {self.SCENARIO_ROWS} of {len(quoted)} tickers; Total covers all.")
+
+        label_width, cell_width, cell_height = 70, 64, 20
+        for j, shock in enumerate(shocks.tolist()):
+            canvas.create_text(label_width + j * cell_width + cell_width // 2, cell_height // 2, text=f"{shock:+.0%}")
+        for i, (label, row) in enumerate(zip(labels, rows)):
+            top = (i + 1) * cell_height
+            canvas.create_text(6, top + cell_height // 2, text=label, anchor="w", font=("TkDefaultFont", 9, "bold") if i == 0 else None)
+            scale = np.max(np.abs(row)) or 1.0
+            for j, cell in enumerate(row.tolist()):
+                left = label_width + j * cell_width
+                shade = int(255 - 155 * min(1.0, abs(cell) / scale))
+                fill = f"#{shade:02x}ff{shade:02x}" if cell >= 0 else f"#ff{shade:02x}{shade:02x}"
+                canvas.create_rectangle(left, top, left + cell_width, top + cell_height, fill=fill, outline="#f0f0f0")
+                canvas.create_text(left + cell_width - 4, top + cell_height // 2, text=f"{cell:,.0f}", anchor="e")
+        canvas.configure(scrollregion=(0, 0, label_width + len(shocks) * cell_width, (len(labels) + 1) * cell_height))
+
+        def describe(event):
+            j = int((canvas.canvasx(event.x) - label_width) // cell_width)
+            i = int(canvas.canvasy(event.y) // cell_height) - 1
+            if 0 <= i < len(labels) and 0 <= j < len(shocks):
+                price = f" ({prices[i] * (1 + shocks[j]):,.2f})" if i else ""
+                status.config(text=f"{labels[i]} {shocks[j]:+.0%}{price}: value {rows[i][j]:+,.2f}, "
+                                   f"{itm_rows[i][j]} of {position_rows[i]} positions ITM")
+        canvas.bind("<Motion>", describe)
+        canvas.bind("<MouseWheel>", lambda event: canvas.yview_scroll(-1 if event.delta > 0 else 1, "units"))
+
+    def fetch_initial_prices(self, priority=False):
+        unique_tickers = self.data.tickers()
+        pending = [t for t in unique_tickers if t not in self.price_cache or self.price_cache[t] in ["....", "?"]
+                   or t in self.stale_tickers]
+        if pending:
+            for ticker in pending:
+                if ticker not in self.stale_tickers:
+                    self.price_cache[ticker] = "...."
+            self.request_render(pending)
+            self._start_fetch(pending, priority=priority)
+
+    def make_quote_provider(self):
+        return make_quote_provider(self.QUOTE_SOURCE, os.path.dirname(self.data_file), self.QUOTE_BATCH_SIZE, self.FETCH_WORKERS)
+
+    def _start_fetch(self, tickers, on_done=None, priority=False):
+        # Network work runs on the coordinator's thread, results are handed back to the Tk thread
+        self.fetcher.request(tickers, priority=priority, on_done=None if on_done is None else lambda: self._post(on_done))
+
+    def _post(self, func, *args):
+        # Called from worker threads, which must not touch Tk; the Tk thread drains the queue
+        self._posted.put((func, args))
+
+    def _drain_posted(self):
+        while True:
+            try:
+                func, args = self._posted.get_nowait()
+            except Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                if not (self._closed and isinstance(e, tk.TclError)):  # widgets are gone once the window closed
+                    self.root.report_callback_exception(type(e), e, e.__traceback__)
+        if not self._closed:
+            self._post_job = self.root.after(self.POST_POLL_MS, self._drain_posted)
+
+    def _apply_quotes(self, quotes, seq=None):
+        now = time_module.time()
+        if self._awaiting_first_quotes:
+            self._awaiting_first_quotes = False
+            elapsed = time_module.perf_counter() - STARTED
+            metrics.record("startup.first_quotes", elapsed)
+            log.info("Startup: first quotes after %.2fs", elapsed)
+        for ticker, quote in quotes.items():
+            if seq is not None:
+                if seq < self._quote_seq.get(ticker, 0):
+                    continue  # an older lookup finishing late
+                self._quote_seq[ticker] = seq
+            if quote == "?" and ticker in self.stale_tickers:
+                continue  # keep showing the cached value rather than losing it to a failed lookup
+            self.price_cache[ticker] = quote
+            self.quote_times[ticker] = now
+            self.stale_tickers.discard(ticker)
+        self.request_render(quotes)
+        if self._quote_save_job is None:
+            self._quote_save_job = self.root.after(1000, self.save_quote_cache)
 
     def populate_treeview(self):
-        # Clear tree
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-    
+        # Reconcile the tree with the model: one stable item per position, only changed cells are touched
+        with metrics.timer("render.populate"):
+            self._populate_treeview()
+
+    def _populate_treeview(self):
+        self._render_all = False
+        self._dirty_tickers.clear()
+
         # Get selected filter
         selected_filter = self.filter_var.get() if hasattr(self, 'filter_var') else "All"
-    
-        unique_tickers = {row[0] for row in self.data if len(row) == 6}
+
+        unique_tickers = self.data.tickers()
         for ticker in unique_tickers:
             if ticker not in self.price_cache:
                 self.price_cache[ticker] = "...."
-    
-        for index, row in enumerate(self.data):
-            if len(row) != 6:
-                continue
-    
-            # Apply filter
-            if selected_filter != "All" and row[2] != selected_filter:
-                continue
-    
-            ticker, ends, option = row[0], row[1], row[2]
-            contracts = row[3]
-            premium = row[4]
-            strike_price = row[5]
-            current_price = self.price_cache.get(ticker, "....")
-    
-            outcome = ""
-            diff = float('nan')
-            diff_fmt = ""
-            value = ""
-            value_fmt = ""
-    
-            if current_price not in ["....", "?"] and not math.isnan(current_price):
-                if option == "Call":
-                    diff = current_price - strike_price
-                else:  # Put
-                    diff = strike_price - current_price
-    
-                diff_fmt = f"+{round(diff, 2):.2f}" if diff > 0 else f"-{round(abs(diff), 2):.2f}" if diff < 0 else ""
-                outcome = self.calculate_outcome(option, current_price, strike_price)
-                intrinsic = max(0.0, diff)
-
-                if outcome:
-                    if option == "Put" and outcome == "Purchase":
-                        effective_cost = strike_price - (premium / (contracts * 100))
-                        value_num = (current_price - effective_cost) * (contracts * 100)
-                    else:
-                        value_num = (diff * (contracts * 100)) - premium
-                        if option == "Call" and outcome == "Sell":
-                            value_num = -value_num
-
-                    value = round(value_num, 2)
-                    value_fmt = f"+{value:,.0f}" if value > 0 and value.is_integer() else \
-                                f"+{value:,.2f}" if value > 0 else \
-                                f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
-                else:
-                    value = ""
-                    value_fmt = ""
-    
-            diff_tag = 'green_diff' if not math.isnan(diff) and diff > 0 else 'red_diff' if not math.isnan(diff) and diff < 0 else ''
-            strike_price_fmt = int(strike_price) if strike_price == int(strike_price) else round(strike_price, 2)
-            current_price_fmt = current_price if current_price in ["....", "?"] else (
-                int(current_price) if current_price == int(current_price) else round(current_price, 2)
-            )
-            tag = 'redrow' if outcome else ('oddrow' if index % 2 else 'evenrow')
-    
-            item = self.tree.insert("", "end", tags=(tag, f"list_index_{index}"), values=(
-                ticker, ends, option, contracts, int(premium), strike_price_fmt, current_price_fmt, diff_fmt, outcome, value_fmt
-            ))
-    
-            if diff_tag:
-                self.tree.set(item, "Diff", diff_fmt)
-    
+
+        if self._valuation_version != self.data.version:
+            self.valuation = BookValuation(self.data, self.price_cache, self.show_greeks, self.RISK_FREE_RATE)
+            self._valuation_version = self.data.version
+            self._iids = [str(pid) for pid in self.valuation.ids]
+            self._item_rows = {iid: (index, position) for index, (iid, position) in enumerate(zip(self._iids, self.valuation.positions))}
+            self._ticker_items = {}
+            for iid, position in zip(self._iids, self.valuation.positions):
+                self._ticker_items.setdefault(position.ticker, []).append(iid)
+            self.alerts.build(self.valuation)
+            if self.show_marks:
+                self.root.after_idle(self.fetch_marks)  # fresh arrays for the new book
+        else:
+            self.valuation.set_prices(self.price_cache)
+            self._notify_alerts(self.alerts.update(self.valuation, self.price_cache))
+        if self.sort_index is not None:
+            self.sort_index.build(self.valuation)
+
+        self._build_view(selected_filter)
+        self._render_window()
+        self._update_timestamp()
+
+    def toggle_greeks(self):
+        # Extra columns are hidden, not removed, so rows keep one layout; they are only computed while shown
+        self.show_greeks = self.greeks_var.get()
+        self.tree["displaycolumns"] = self._display_columns()
+        self.valuation.set_greeks(self.show_greeks)
+        self.populate_treeview()
+
+    def toggle_marks(self):
+        self.show_marks = self.marks_var.get()
+        self.tree["displaycolumns"] = self._display_columns()
+        if not self.show_marks:
+            self.valuation.clear_marks()
+        self.populate_treeview()
+        self.fetch_marks()
+
+    def _display_columns(self):
+        return (self.base_columns + (GREEK_COLUMNS if self.show_greeks else ())
+                + (MARK_COLUMNS if self.show_marks else ()))
+
+    def fetch_marks(self):
+        # Fill the Marks columns from cached chains and request the missing or expired ones, one per (ticker, expiry)
+        if not self.show_marks or not len(self.data):
+            return
+        today = datetime.now(MarketCalendar.TZ).date()
+        fresh = self.valuation.marks_day != today  # new book, new day or just switched on: nothing filled in yet
+        pairs = [pair for pair in self.valuation.chain_pairs(today) if pair[1] is not None and pair[1] >= today]
+        if fresh:
+            for pair in pairs:
+                table = self.chains.get(pair)
+                if table is not None:
+                    self.valuation.set_marks(pair, table)
+            self.request_render()
+        self.chains.request(pairs, lambda pair: self._post(self._apply_chain, pair))
+
+    def _apply_chain(self, pair):
+        table = self.chains.get(pair)
+        if self.show_marks and table is not None:
+            self.valuation.set_marks(pair, table)
+            self.request_render([pair[0]])
+
+    def _build_view(self, selected_filter):
+        # Filtered, sorted list of row ids; the store itself stays in saved order
+        indices = self.sort_index.display_order() if self.sort_index is not None else np.arange(len(self.valuation.ids))
+        if selected_filter != "All":
+            indices = indices[self.valuation.is_call[indices] == (selected_filter == "Call")]
+
+        iids = self._iids
+        self._view = [iids[index] for index in indices.tolist()]
+        self._virtual = len(self._view) > self.VIRTUAL_THRESHOLD
+
+    def _render_window(self):
+        # Materialize the rows of the view that the tree should hold: all of them, or in virtual mode
+        # only the viewport plus VIRTUAL_BUFFER rows either side
+        self._window_job = None
+        if self._virtual:
+            visible = self._visible_rows()
+            self._view_offset = max(0, min(self._view_offset, len(self._view) - visible))
+            start = max(0, self._view_offset - self.VIRTUAL_BUFFER)
+            window = self._view[start:self._view_offset + visible + self.VIRTUAL_BUFFER]
+        else:
+            start = 0
+            window = self._view
+        self._window_start = start
+        self._window_len = len(window)
+
+        keep = set(window)
+        stale = [iid for iid in self._rendered if iid not in keep]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._rendered[iid]
+
+        self._window_rows = {iid: start + offset for offset, iid in enumerate(window)}
+        for iid in window:
+            self._render_row(iid)
+
+        if self.tree.get_children() != tuple(window):
+            self.tree.set_children("", *window)
+
+        if self._virtual and window:
+            self.tree.yview_moveto((self._view_offset - start) / len(window))
+            self._update_virtual_scrollbar()
+
+    def _visible_rows(self):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(1, (self.tree.winfo_height() - row_height) // row_height)  # minus the heading row
+
+    def _update_virtual_scrollbar(self):
+        total = len(self._view)
+        self.scrollbar.set(self._view_offset / total, min(1.0, (self._view_offset + self._visible_rows()) / total))
+
+    def _on_tree_yscroll(self, first, last):
+        if not self._virtual:
+            self.scrollbar.set(first, last)
+            return
+        # The tree scrolled inside its window (wheel, keys, see()): follow it, and page in more rows near the edges
+        self._view_offset = self._window_start + round(float(first) * self._window_len)
+        self._update_virtual_scrollbar()
+        margin = self.VIRTUAL_BUFFER // 2
+        near_top = self._window_start > 0 and self._view_offset - self._window_start < margin
+        near_bottom = (self._window_start + self._window_len < len(self._view)
+                       and self._window_start + self._window_len - (self._view_offset + self._visible_rows()) < margin)
+        if (near_top or near_bottom) and self._window_job is None:
+            self._window_job = self.root.after_idle(self._render_window)
+
+    def _on_scrollbar(self, *args):
+        if not self._virtual:
+            self.tree.yview(*args)
+            return
+        visible = self._visible_rows()
+        if args[0] == "moveto":
+            offset = int(float(args[1]) * len(self._view))
+        else:  # scroll N units|pages
+            offset = self._view_offset + int(args[1]) * (visible if args[2] == "pages" else 1)
+        self._view_offset = max(0, min(offset, len(self._view) - visible))
+        if self._window_start <= self._view_offset and self._view_offset + visible <= self._window_start + self._window_len:
+            self.tree.yview_moveto((self._view_offset - self._window_start) / self._window_len)
+            self._update_virtual_scrollbar()
+        else:
+            self._render_window()
+
+    def request_render(self, tickers=None):
+        # Merge updates arriving within one frame into a single repaint; None means the whole view
+        if tickers is None:
+            self._render_all = True
+        else:
+            self._dirty_tickers.update(tickers)
+        if self._render_job is None:
+            self._render_job = self.root.after(self.RENDER_DELAY_MS, self._flush_render)
+
+    def _flush_render(self):
+        self._render_job = None
+        if self._render_all:
+            self.populate_treeview()
+            return
+        start = time_module.perf_counter()
+        dirty, self._dirty_tickers = self._dirty_tickers, set()
+        self.valuation.set_prices({ticker: self.price_cache.get(ticker) for ticker in dirty})
+        self._notify_alerts(self.alerts.update(self.valuation, dirty))
+        if self.sort_index is not None:
+            with metrics.timer("sort.update"):
+                moved = self.sort_index.update(self.valuation, dirty)
+            if moved:
+                self._build_view(self.filter_var.get())
+                self._render_window()
+        for ticker in dirty:
+            for iid in self._ticker_items.get(ticker, ()):
+                if iid in self._window_rows:  # rows outside the view or virtual window are drawn when paged in
+                    self._render_row(iid)
+        self._update_timestamp()
+        metrics.record("render.update", time_module.perf_counter() - start)
+
+    def _render_row(self, iid):
+        index, position = self._item_rows[iid]
+        display = self._row_display(index, position, self._window_rows[iid])
+        previous = self._rendered.get(iid)
+        if previous == display:
+            return
+        values, tags = display
+        if previous is None:
+            self.tree.insert("", "end", iid=iid, tags=tags, values=values)
+        elif previous[0] != values:
+            self.tree.item(iid, values=values, tags=tags)
+        else:
+            self.tree.item(iid, tags=tags)
+        self._rendered[iid] = display
+
+    def _row_display(self, index, position, row_no):
+        ticker, ends, option = position.ticker, position.ends, position.option
+        contracts = position.contracts
+        premium = position.premium
+        strike_price = position.strike
+        current_price = self.price_cache.get(ticker, "....")
+
+        outcome = ""
+        diff_fmt = ""
+        value_fmt = ""
+
+        diff = float(self.valuation.diff[index])
+        if not math.isnan(diff):
+            diff_fmt = f"+{round(diff, 2):.2f}" if diff > 0 else f"-{round(abs(diff), 2):.2f}" if diff < 0 else ""
+            outcome = self.valuation.outcome(index)
+
+            if outcome:
+                value = round(float(self.valuation.value[index]), 2)
+                value_fmt = f"+{value:,.0f}" if value > 0 and value.is_integer() else \
+                            f"+{value:,.2f}" if value > 0 else \
+                            f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+
+        strike_price_fmt = int(strike_price) if strike_price == int(strike_price) else round(strike_price, 2)
+        current_price_fmt = current_price if current_price in ["....", "?"] else (
+            int(current_price) if current_price == int(current_price) else round(current_price, 2)
+        )
+        tag = 'redrow' if outcome else 'alert' if index in self.alerts.active else ('oddrow' if row_no % 2 else 'evenrow')
+        tags = (tag, 'stale') if ticker in self.stale_tickers else (tag,)
+
+        values = (ticker, ends, option, contracts, int(premium), strike_price_fmt, current_price_fmt, diff_fmt, outcome, value_fmt)
+        return values + self._greeks_display(index) + self._marks_display(index), tags
+
+    def _greeks_display(self, index):
+        if not self.valuation.greeks:
+            return ("",) * len(GREEK_COLUMNS)
+        delta, gamma, theta, vega, iv = (float(self.valuation.greeks[col][index]) for col in GREEK_COLUMNS)
+        if math.isnan(iv):
+            return ("",) * len(GREEK_COLUMNS)
+        return f"{delta:.2f}", f"{gamma:.4f}", f"{theta:.2f}", f"{vega:.2f}", f"{iv * 100:.1f}%"
+
+    def _marks_display(self, index):
+        if not self.valuation.marks:
+            return ("",) * len(MARK_COLUMNS)
+        bid, ask, mark, pnl = (float(self.valuation.marks[col][index]) for col in MARK_COLUMNS)
+        cells = tuple("" if math.isnan(value) else f"{value:.2f}" for value in (bid, ask, mark))
+        return cells + ("" if math.isnan(pnl) else f"{pnl:+,.0f}" if pnl.is_integer() else f"{pnl:+,.2f}",)
+
+    def _update_timestamp(self):
         #Only update time if price checked
         if getattr(self, "_just_refreshed", False):
             self.last_updated_label.config(text=f"{datetime.now().strftime('%H:%M:%S')}")
             self._just_refreshed = False
 
-    def calculate_outcome(self, call_put, current_price, strike_price):
-        # returns Sell for Calls (if ITM), Purchase for Puts (if ITM)
-        if call_put == "Put":
-            return "Purchase" if strike_price > current_price else ""
-        else:  # Call
-            return "Sell" if strike_price < current_price else ""
-
     def refresh_data(self):
+        self.fetch_marks()
+        if self._refresh_running:
+            return
+        unique_tickers = self.data.tickers()
+        pending = [t for t in unique_tickers if t not in self.price_cache or t in self.stale_tickers or self.is_market_open()]
+        if not pending:
+            self._just_refreshed = True
+            self._update_timestamp()
+            return
+        self._refresh_running = True
+        self._start_fetch(pending, on_done=self._refresh_done)
+
+    def refresh_adaptive(self):
+        # Fetch the tickers that are most overdue for their adaptive interval, within this pass's share of the budget
+        if not len(self.data):
+            return
+        if self._valuation_version != self.data.version:
+            self.populate_treeview()
+        self.fetch_marks()
+        intervals = refresh_intervals(self.valuation, datetime.now(MarketCalendar.TZ).date(), self.ADAPTIVE_MIN, self.ADAPTIVE_MAX)
+        now = time_module.time()
+        overdue = []
+        for ticker, interval in zip(self.valuation.tickers.tolist(), intervals.tolist()):
+            last = max(self.quote_times.get(ticker, 0), self._adaptive_attempts.get(ticker, 0))  # failures don't hog the budget
+            ratio = (now - last) / interval
+            if ratio >= 1:
+                overdue.append((ratio, ticker))
+        overdue.sort(reverse=True)
+        budget = max(1, self.ADAPTIVE_BUDGET * self.ADAPTIVE_TICK // 60)
+        due = [ticker for _, ticker in overdue[:budget]]
+        for ticker in due:
+            self._adaptive_attempts[ticker] = now
+        if due:
+            self._start_fetch(due, on_done=self._adaptive_done)
+
+    def _adaptive_done(self):
         self._just_refreshed = True
-        unique_tickers = {row[0] for row in self.data if len(row) == 6}
-        for ticker in unique_tickers:
-            if ticker not in self.price_cache or self.is_market_open():
-                for attempt in range(3):
-                    try:
-                        yf_ticker = yf.Ticker(ticker)
-                        quote = yf_ticker.get_info().get('regularMarketPrice', None)
-                        if quote is None or (isinstance(quote, float) and math.isnan(quote)):
-                            history = yf_ticker.history(period="1d")
-                            quote = round(history["Close"].iloc[-1], 2) if not history.empty and not math.isnan(history["Close"].iloc[-1]) else None
-                        self.price_cache[ticker] = quote if quote is not None and not math.isnan(quote) else "?"
-                        if self.DevMode == 1:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Lookup {ticker}: {self.price_cache[ticker]}")
-                        break
-                    except Exception as e:
-                        if self.DevMode == 1:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Lookup {ticker}: Failed, Error: {str(e)}")
-                        if attempt < 2:
-                            time_module.sleep(1)
-                        self.price_cache[ticker] = "?"
-                self.root.after(0, self.populate_treeview)
-
-        self.root.after(0, self.populate_treeview)
+        self._update_timestamp()
+
+    def _refresh_done(self):
+        self._refresh_running = False
+        self._just_refreshed = True
+        self._update_timestamp()
+
+    def on_close(self):
+        self._closed = True
+        self.root.after_cancel(self._post_job)
+        self.fetcher.close()
+        self.chains.close()
+        self.quote_provider.close()
+        if self._quote_save_job is not None:
+            self.root.after_cancel(self._quote_save_job)
+            self.save_quote_cache()
+        self.root.after_cancel(self._metrics_job)
+        self.save_metrics(reschedule=False)
+        self.root.destroy()
 
     def remove_selected(self):
         selected = self.tree.selection()
         if selected:
-            indices_to_drop = []
-            for item in selected:
-                tags = self.tree.item(item, "tags")
-                for tag in tags:
-                    if tag.startswith("list_index_"):
-                        indices_to_drop.append(int(tag.replace("list_index_", "")))
-                        break
-            if indices_to_drop:
-                self.data = [row for i, row in enumerate(self.data) if i not in indices_to_drop]
+            removed = self.data.remove(int(item) for item in selected)
+            if removed:
                 self.populate_treeview()
-                self.save_data()
+                self.storage.delete(self.data, [position.id for position in removed])
 
     def confirm_remove_all(self):
         if messagebox.askyesno("Confirm", "Remove all options?"):
             self.remove_all()
 
     def remove_all(self):
-        self.data = []
+        self.data.clear()
         self.price_cache = {}
+        self.quote_times = {}
+        self.stale_tickers = set()
+        self.save_quote_cache()
         self.populate_treeview()
-        self.save_data()
+        self.storage.clear(self.data)
 
     def sort_column(self, col):
         self.current_sort_col = col
         self.current_sort_reverse = not self.sort_reverse.get(col, False)
         self.sort_reverse[col] = self.current_sort_reverse
+        with metrics.timer("sort.column"):
+            self.sort_index = SortIndex(col, self.current_sort_reverse)
+            self.populate_treeview()
 
-        # Data rows: [Ticker, Ends, Option, Contracts, Premium, Strike]
-        def get_sort_key(item):
-            # item is one of the rows from self.data
-            if len(item) != 6:
-                return (float('inf'), "")
-            ticker = item[0]
-
-            if col == "Ticker":
-                return (item[0], ticker)
-            if col == "Ends":
-                try:
-                    month, day = map(int, item[1].split('/'))
-                    current_year = datetime.now().year
-                    return ((current_year, month, day), ticker)
-                except Exception:
-                    return ((9999, 12, 31), ticker)
-            if col == "Option":
-                return (item[2], ticker)
-            if col == "Contracts":
-                return (item[3], ticker)
-            if col == "Premium":
-                return (item[4], ticker)
-            if col == "Strike":
-                return (item[5], ticker)
-            if col == "Current":
-                current_price = self.price_cache.get(ticker, float('nan'))
-                return (current_price, ticker) if current_price not in ["....", "?"] and not math.isnan(current_price) else (float('inf'), ticker)
-            if col == "Diff":
-                current_price = self.price_cache.get(ticker, float('nan'))
-                strike_price = item[5]
-                if item[2] == "Call":
-                    if current_price not in ["....", "?"] and not math.isnan(current_price):
-                        diff = current_price - strike_price
-                        return (diff, ticker)
-                else:  # Put
-                    if current_price not in ["....", "?"] and not math.isnan(current_price):
-                        diff = strike_price - current_price
-                        return (diff, ticker)
-                return (float('inf'), ticker)
-            if col == "Value":
-                current_price = self.price_cache.get(ticker, float('nan'))
-                strike_price = item[5]
-                contracts = item[3]
-                premium = item[4]
-                if current_price not in ["....", "?"] and not math.isnan(current_price):
-                    if item[2] == "Call":
-                        intrinsic = max(0.0, current_price - strike_price)
-                    else:
-                        intrinsic = max(0.0, strike_price - current_price)
-                    value = (intrinsic * (contracts * 100)) - premium
-                    return (value, ticker)
-                return (float('inf'), ticker)
-            if col == "Outcome":
-                return (self.calculate_outcome(item[2], self.price_cache.get(ticker, float('nan')) if self.price_cache.get(ticker, float('nan')) not in ["....", "?"] else float('nan'), item[5]), ticker)
-
-            return (str(item[0]), ticker)
-
-        self.data = sorted(self.data, key=get_sort_key, reverse=self.current_sort_reverse)
-        self.populate_treeview()
+    def show_menu(self, event):
+        self.menu.tk_popup(event.x_root, event.y_root)
+        self.menu.grab_release()
 
     def on_double_click(self, event):
         item = self.tree.identify_row(event.y)
@@ -537,24 +2318,136 @@ class OptionsMonitor:
                     entry.destroy()
                     return
 
-                row_values = self.tree.item(item, "values")
-                if row_values:
-                    ticker, ends, option = row_values[0], row_values[1], row_values[2]
-                    strike = float(row_values[5])
-                    for i, row in enumerate(self.data):
-                        if (len(row) == 6 and row[0] == ticker and row[1] == ends
-                                and row[2] == option and row[5] == strike):
-                            self.data[i][col_index] = new_value
-                            break
+                pid = int(item)
+                if pid in self.data:
+                    field = Position.FIELDS[col_index]
+                    self.data.update(pid, field, new_value)
+                    self.storage.update(self.data, self.data.get(pid), field)
 
                 self.populate_treeview()
-                self.save_data()
                 entry.destroy()
 
             entry.bind("<Return>", save_edit)
             entry.bind("<FocusOut>", save_edit)
 
+# Headless mode: value positions files without Tk, e.g. from cron over many accounts.
+#   python OptionsMonitor.py --headless acct1.csv acct2.csv --format json --summary totals.json
+VALUED_COLUMNS = ("Ticker", "Ends", "Option", "Contracts", "Premium", "Strike", "Current", "Diff", "Outcome", "Value")
+
+
+def fetch_quotes(tickers, provider, batch_size=100):
+    # Blocking fetch through a FetchCoordinator, for callers without a Tk loop
+    quotes = {}
+    done = threading.Event()
+    coordinator = FetchCoordinator(provider, lambda partial, seq: quotes.update(partial), batch_size)
+    coordinator.request(tickers, on_done=done.set)
+    done.wait()
+    coordinator.close()
+    return quotes
+
+
+def book_tickers(path):
+    store = PositionStore()
+    try:
+        read_positions_csv(path, store)
+    except OSError:
+        return set()  # reported by value_book_file
+    return store.tickers()
+
+
+def valued_rows(valuation, missing=""):
+    # VALUED_COLUMNS for each position, unformatted; missing where there is no quote or the position is OTM
+    def cells(values):
+        return [missing if math.isnan(value) else round(value, 2) for value in values.tolist()]
+    current, diff, value = cells(valuation.current), cells(valuation.diff), cells(valuation.value)
+    for i, position in enumerate(valuation.positions):
+        yield (position.ticker, position.ends, position.option, position.contracts, position.premium, position.strike,
+               current[i], diff[i], valuation.outcome(i), value[i])
+
+
+def value_book_file(path, quotes, out_path, fmt="csv"):
+    # One book: load, value against quotes, write out_path (csv or json). Returns the book's totals.
+    store = PositionStore()
+    report = ImportReport()
+    try:
+        read_positions_csv(path, store, report)
+    except OSError as e:
+        report.error = str(e)
+    valuation = BookValuation(store, quotes)
+
+    if report.error and not len(store):
+        out_path = None  # nothing to write
+    else:
+        with atomic_write(out_path, newline='') as f:
+            if fmt == "json":
+                json.dump({"book": path, "positions": [dict(zip(VALUED_COLUMNS, row)) for row in valued_rows(valuation, None)]}, f)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(VALUED_COLUMNS)
+                writer.writerows(valued_rows(valuation))
+
+    quoted = ~np.isnan(valuation.current)
+    return {
+        "book": path,
+        "output": out_path,
+        "error": report.error,
+        "positions": len(store),
+        "rejected": report.rejected,
+        "quoted": int(quoted.sum()),
+        "itm": int(valuation.itm.sum()),
+        "premium": round(float(valuation.premium.sum()), 2),
+        "value": round(float(np.nansum(valuation.value)), 2),  # ITM positions at expiration
+        "at_expiration": round(float(np.where(valuation.itm, valuation.value, valuation.premium)[quoted].sum()), 2),
+    }
+
+
+def run_headless(argv):
+    parser = argparse.ArgumentParser(prog="OptionsMonitor --headless", description="Value positions files without the window")
+    parser.add_argument("books", nargs="+", help="positions CSV files, e.g. one per account")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--out-dir", help="where valued books are written (default: beside each book, as NAME.valued.csv)")
+    parser.add_argument("--summary", help="also write per-book and total figures to this JSON file")
+    parser.add_argument("--quotes", choices=("yahoo", "replay"), default=OptionsMonitor.QUOTE_SOURCE)
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    log.addHandler(logging.StreamHandler())
+    log.setLevel(logging.INFO)
+    books = args.books
+    outputs = [os.path.join(args.out_dir or os.path.dirname(book), f"{os.path.splitext(os.path.basename(book))[0]}.valued.{args.format}")
+               for book in books]
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    # Books are read and valued in parallel, but quotes are fetched once, in this process, for every
+    # ticker across all books, so accounts holding the same underlyings share each lookup
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        tickers = set().union(*pool.map(book_tickers, books))
+        provider = make_quote_provider(args.quotes, os.path.dirname(os.path.abspath(books[0])),
+                                       OptionsMonitor.QUOTE_BATCH_SIZE, OptionsMonitor.FETCH_WORKERS)
+        try:
+            quotes = fetch_quotes(sorted(tickers), provider, OptionsMonitor.QUOTE_BATCH_SIZE)
+        finally:
+            provider.close()
+        results = list(pool.map(value_book_file, books, [quotes] * len(books), outputs, [args.format] * len(books)))
+
+    totals = {key: sum(result[key] for result in results)
+              for key in ("positions", "rejected", "quoted", "itm", "premium", "value", "at_expiration")}
+    for result in results + [dict(totals, book="Total")]:
+        line = (f"{result['book']}: {result['positions']:,} positions, {result['rejected']:,} rejected, "
+                f"{result['quoted']:,} quoted, {result['itm']:,} ITM, "
+                f"value {result['value']:+,.2f}, at expiration {result['at_expiration']:+,.2f}")
+        print(line + (f" (error: {result['error']})" if result.get("error") else ""))
+    if args.summary:
+        with atomic_write(args.summary) as f:
+            json.dump({"time": datetime.now().isoformat(timespec="seconds"), "books": results, "total": totals}, f, indent=2)
+    return 1 if any(result["error"] for result in results) else 0
+
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if "--headless" in sys.argv[1:]:
+        sys.exit(run_headless([arg for arg in sys.argv[1:] if arg != "--headless"]))
     root = tk.Tk()
     if getattr(sys, 'frozen', False):
         icon_path = os.path.join(sys._MEIPASS, 'om.ico')
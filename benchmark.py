@@ -0,0 +1,259 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import tkinter as tk
+
+import OptionsMonitor as om
+
+# Times the main paths on synthetic books and writes the results as JSON, so runs can be compared across versions.
+#   python benchmark.py --sizes 1000,10000,100000,1000000 --out bench_results.json
+
+SYMBOLS = "AAPL,MSFT,AMZN,GOOGL,META,NVDA,TSLA,JPM,V,XOM,JNJ,WMT,PG,KO,PEP,DIS,INTC,AMD,NFLX,BA"
+COLUMNS = ("Ticker", "Ends", "Option", "Contracts", "Premium", "Strike", "Current", "Diff", "Outcome", "Value")
+FILTERS = ("Call", "Put", "All")
+
+
+def make_book(path, size, tickers, seed=0):
+    # Synthetic data.csv with size positions spread over tickers underlyings
+    rng = random.Random(seed)
+    names = [f"T{i:04d}" for i in range(tickers)]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Ticker", "Ends", "Option", "Contracts", "Premium", "Strike"])
+        for _ in range(size):
+            writer.writerow([
+                rng.choice(names),
+                f"{rng.randint(1, 12)}/{rng.randint(1, 28)}",
+                rng.choice(("Call", "Put")),
+                rng.randint(1, 20),
+                round(rng.uniform(10, 2000), 2),
+                rng.randint(5, 500)
+            ])
+    return names
+
+
+def timed(func, repeat):
+    # Best of repeat runs, in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_cold_start(repeat):
+    # Fresh interpreters: importing the app (what stands between launch and the window), then the quote stack it defers
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for operation, code in (("import_app", "import OptionsMonitor"),
+                            ("import_quote_stack", "import OptionsMonitor; OptionsMonitor.load_yfinance()")):
+        results[operation] = timed(lambda: subprocess.run([sys.executable, "-c", code], cwd=here, check=True), repeat)
+    return results
+
+
+def bench_quote_paths(source, symbols, repeat, latency):
+    # The bulk download against the per-ticker loop, over the same tickers. "yahoo" times the real
+    # YahooQuoteProvider._batch_quotes and _lookup_ticker (network); "replay" models both with one
+    # batch versus one request per ticker, each paying latency.
+    if source == "yahoo":
+        provider = om.YahooQuoteProvider(batch_size=len(symbols))
+        batch = lambda: provider._batch_quotes(symbols)
+        loop = lambda: [provider._lookup_ticker(ticker) for ticker in symbols]
+    else:
+        provider = om.ReplayQuoteProvider(latency=latency, batch_size=len(symbols), seed=1)
+        batch = lambda: provider.fetch(symbols)
+        loop = lambda: [provider.fetch([ticker]) for ticker in symbols]
+    results = {"quotes_batch": timed(batch, repeat), "quotes_loop": timed(loop, repeat)}
+    provider.close()
+    return results
+
+
+def bench_model(path, names, repeat, latency=0.0):
+    # Everything below the Tk view: storage, valuation, sort index, filter and a refresh cycle
+    results = {}
+    storage = om.CsvStorage(path)
+    results["load_data"] = timed(storage.load, repeat)
+    store = storage.load()
+    results["save_data"] = timed(lambda: om.write_positions_csv(path + ".out", store), repeat)
+
+    provider = om.ReplayQuoteProvider(latency=latency, seed=1)
+    prices = provider.fetch(names)
+    results["valuation"] = timed(lambda: om.BookValuation(store, prices), repeat)
+    valuation = om.BookValuation(store, prices)
+    results["reprice"] = timed(lambda: valuation.set_prices(prices), repeat)
+
+    for col in COLUMNS:
+        index = om.SortIndex(col, False)
+        results[f"sort_{col}"] = timed(lambda: index.build(valuation), repeat)
+
+    index = om.SortIndex("Diff", False)
+    index.build(valuation)
+    order = index.display_order()
+    for choice in FILTERS:
+        def view():
+            indices = order if choice == "All" else order[valuation.is_call[order] == (choice == "Call")]
+            return [valuation.ids[i] for i in indices.tolist()]
+        results[f"filter_{choice}"] = timed(view, repeat)
+
+    def refresh():
+        quotes = provider.fetch(names)
+        valuation.set_prices(quotes)
+        index.update(valuation, quotes)
+    results["refresh_all"] = timed(refresh, repeat)
+
+    def tick():
+        quotes = provider.fetch(names[:1])
+        valuation.set_prices(quotes)
+        index.update(valuation, quotes)
+    results["refresh_one_ticker"] = timed(tick, repeat)
+
+    # The app's refresh path without Tk: every ticker requested from a FetchCoordinator, its partial results
+    # posted to a queue (root.after in the app) and merged into one reprice and resort once on_done fires
+    posted = deque()
+    coordinator = om.FetchCoordinator(provider, lambda quotes, seq: posted.append(quotes), batch_size=om.OptionsMonitor.QUOTE_BATCH_SIZE)
+
+    def coordinated_refresh():
+        done = threading.Event()
+        coordinator.request(names, on_done=done.set)
+        done.wait()
+        dirty = {}
+        while posted:
+            dirty.update(posted.popleft())
+        valuation.set_prices(dirty)
+        index.update(valuation, dirty)
+    results["refresh_coordinated"] = timed(coordinated_refresh, repeat)
+    coordinator.close()
+    return results
+
+
+def bench_ui(path, names, repeat, latency=0.0):
+    # The same paths through OptionsMonitor itself, against a hidden Tk root and replayed quotes
+    root = tk.Tk()
+    root.withdraw()
+
+    class BenchMonitor(om.OptionsMonitor):
+        DATA_FILE = path
+        QUOTE_SOURCE = "replay"
+
+        def make_quote_provider(self):
+            return om.ReplayQuoteProvider(latency=latency, batch_size=self.QUOTE_BATCH_SIZE)
+
+        def is_market_open(self):
+            return True  # refresh_data refetches every ticker, as during a session
+
+        def setup_logging(self):
+            pass  # no OptionsMonitor.log left open in a temp directory that is about to be removed
+
+    results = {}
+    start = time.perf_counter()
+    app = BenchMonitor(root)
+    results["startup"] = time.perf_counter() - start
+    provider = om.ReplayQuoteProvider(seed=1)
+    app._apply_quotes(provider.fetch(names))
+    app._flush_render()
+
+    def full_render():
+        app.tree.delete(*app.tree.get_children())
+        app._rendered.clear()
+        app.populate_treeview()
+        root.update_idletasks()
+    results["render_full"] = timed(full_render, repeat)
+    results["render_reconcile"] = timed(app.populate_treeview, repeat)
+
+    for col in COLUMNS:
+        results[f"sort_column_{col}"] = timed(lambda: app.sort_column(col), repeat)
+
+    for choice in FILTERS:
+        def toggle():
+            app.filter_var.set(choice)
+            app.populate_treeview()
+        results[f"filter_toggle_{choice}"] = timed(toggle, repeat)
+
+    def refresh():
+        # refresh_data -> FetchCoordinator -> _post -> _apply_quotes -> _flush_render, driven by mainloop() as in the app
+        def check():
+            if app._refresh_running or app._render_job is not None:
+                root.after(1, check)
+            else:
+                root.quit()
+        app.refresh_data()
+        root.after(1, check)
+        root.mainloop()
+        root.update_idletasks()
+    results["refresh_cycle"] = timed(refresh, repeat)
+
+    app.on_close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Options Monitor benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="comma separated book sizes")
+    parser.add_argument("--tickers", type=int, default=500, help="distinct underlyings per book")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation, best is kept")
+    parser.add_argument("--ui-max", type=int, default=100000, help="largest book to run through the Tk view")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the replayed quote source waits per batch (the batch vs loop comparison uses 0.05 if 0)")
+    parser.add_argument("--quotes", choices=("replay", "yahoo"), default="replay", help="source for the batch vs loop comparison")
+    parser.add_argument("--symbols", default=SYMBOLS, help="comma separated tickers for the batch vs loop comparison")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args()
+
+    report = {
+        "version": om.VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "results": []
+    }
+    report["cold_start"] = {operation: round(seconds, 6) for operation, seconds in bench_cold_start(args.repeat).items()}
+    for operation, seconds in report["cold_start"].items():
+        print(f"{'cold':>9}  {operation:<24} {seconds * 1000:10.2f} ms")
+    symbols = [symbol.strip().upper() for symbol in args.symbols.split(",") if symbol.strip()]
+    report["quote_paths"] = {"source": args.quotes, "tickers": len(symbols)}
+    for operation, seconds in bench_quote_paths(args.quotes, symbols, args.repeat, args.latency or 0.05).items():
+        report["quote_paths"][operation] = round(seconds, 6)
+        print(f"{args.quotes:>9}  {operation:<24} {seconds * 1000:10.2f} ms")
+    ui_available = True
+    for size in (int(n) for n in args.sizes.split(",")):
+        workdir = tempfile.mkdtemp(prefix="om_bench_")
+        try:
+            path = os.path.join(workdir, "data.csv")
+            names = make_book(path, size, args.tickers)
+            results = bench_model(path, names, args.repeat, args.latency)
+            if ui_available and size <= args.ui_max:
+                try:
+                    results.update(bench_ui(path, names, args.repeat, args.latency))
+                except tk.TclError as e:  # no display
+                    ui_available = False
+                    report["ui_skipped"] = str(e)
+                    print(f"WARNING: Tk view benchmarks skipped (render, sort_column, filter toggles, refresh_cycle): {e}",
+                          file=sys.stderr)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        for operation, seconds in results.items():
+            report["results"].append({"size": size, "operation": operation, "seconds": round(seconds, 6)})
+            print(f"{size:>9,}  {operation:<24} {seconds * 1000:10.2f} ms")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+import OptionsMonitor as om
+
+
+@pytest.fixture
+def random_book():
+    # Builds (store, quotes, names, rng) for a seeded random book. Strikes and quotes are drawn from
+    # low..high; coarse keeps them whole and premiums in steps of 50, so sort keys tie often.
+    # About one ticker in ten is a placeholder or failed lookup, the last is never quoted at all,
+    # and the first sits on a whole number, so some strikes are hit exactly.
+    def build(seed, size=2000, tickers=40, low=5, high=500, coarse=False):
+        rng = random.Random(seed)
+        names = [f"T{i}" for i in range(tickers)]
+
+        def price():
+            return float(rng.randint(low, high)) if coarse else round(rng.uniform(low, high), 2)
+        store = om.PositionStore()
+        for _ in range(size):
+            ends = "" if rng.random() < 0.1 else f"{rng.randint(1, 12)}/{rng.randint(1, 28)}"
+            premium = float(rng.randint(0, 20) * 50) if coarse else round(rng.uniform(0, 2000), 2)
+            store.add(rng.choice(names), ends, rng.choice(("Call", "Put")), rng.randint(1, 20), premium,
+                      float(rng.randint(low, high)))
+        quotes = {}
+        for name in names[:-1]:
+            roll = rng.random()
+            quotes[name] = "...." if roll < 0.05 else "?" if roll < 0.1 else price()
+        quotes[names[0]] = float((low + high) // 2)
+        return store, quotes, names, rng
+    return build
@@ -0,0 +1,64 @@
+import numpy as np
+
+import OptionsMonitor as om
+
+
+def rescan(engine, valuation):
+    # Every rule evaluated over the whole book
+    expected = {}
+    with np.errstate(invalid='ignore'):
+        checks = (
+            ("ITM", valuation.itm if engine.itm else np.zeros(len(valuation.ids), dtype=bool)),
+            ("near strike", np.abs(valuation.current - valuation.strike) <= engine.near if engine.near is not None
+             else np.zeros(len(valuation.ids), dtype=bool)),
+            ("value", valuation.value < -engine.value_below if engine.value_below is not None
+             else np.zeros(len(valuation.ids), dtype=bool)),
+        )
+    for row in range(len(valuation.ids)):
+        rules = tuple(rule for rule, firing in checks if firing[row])
+        if rules:
+            expected[row] = rules
+    return expected
+
+
+def test_update_matches_full_rescan(random_book):
+    for seed, settings in enumerate(({"itm": True}, {"near": 2.5}, {"value_below": 3000.0},
+                                     {"itm": True, "near": 1.0, "value_below": 500.0})):
+        store, _, names, rng = random_book(seed, size=1500, low=20, high=200)
+        valuation = om.BookValuation(store, {})
+        engine = om.AlertEngine(**settings).build(valuation)
+        assert engine.active == {}
+        prices = {name: rng.uniform(20, 200) for name in names}
+        valuation.set_prices(prices)
+        engine.update(valuation, prices)  # first quotes check every position of the ticker
+        assert engine.active == rescan(engine, valuation)
+        for _ in range(150):
+            name = rng.choice(names)
+            before = dict(engine.active)
+            prices[name] = "?" if rng.random() < 0.05 else prices[name] * float(np.exp(rng.gauss(0, 0.05)))
+            valuation.set_prices({name: prices[name]})
+            fired = engine.update(valuation, [name])
+            if prices[name] == "?":
+                assert engine.active == before  # no quote keeps the last state
+                prices[name] = rng.uniform(20, 200)
+                valuation.set_prices({name: prices[name]})
+                fired = engine.update(valuation, [name])
+            expected = rescan(engine, valuation)
+            assert engine.active == expected
+            assert set(fired) == {row for row, rules in expected.items() if set(rules) - set(before.get(row, ()))}
+
+
+def test_build_starts_from_current_state_without_firing(random_book):
+    store, _, names, rng = random_book(9, size=500, low=20, high=200)
+    valuation = om.BookValuation(store, {name: rng.uniform(20, 200) for name in names})
+    engine = om.AlertEngine(itm=True).build(valuation)
+    assert engine.active == rescan(engine, valuation)
+    assert engine.update(valuation, names) == []
+
+
+def test_no_rules(random_book):
+    store, _, names, rng = random_book(10, size=200, low=20, high=200)
+    valuation = om.BookValuation(store, {name: 50.0 for name in names})
+    engine = om.AlertEngine().build(valuation)
+    valuation.set_prices({names[0]: 500.0})
+    assert engine.update(valuation, [names[0]]) == [] and engine.active == {}
@@ -0,0 +1,78 @@
+from datetime import date, datetime, timedelta
+
+import OptionsMonitor as om
+
+# Published NYSE holiday and early close (13:00) schedules
+HOLIDAYS = {
+    2022: ["2022-01-17", "2022-02-21", "2022-04-15", "2022-05-30", "2022-06-20", "2022-07-04", "2022-09-05",
+           "2022-11-24", "2022-12-26"],
+    2023: ["2023-01-02", "2023-01-16", "2023-02-20", "2023-04-07", "2023-05-29", "2023-06-19", "2023-07-04",
+           "2023-09-04", "2023-11-23", "2023-12-25"],
+    2024: ["2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27", "2024-06-19", "2024-07-04",
+           "2024-09-02", "2024-11-28", "2024-12-25"],
+    2025: ["2025-01-01", "2025-01-09", "2025-01-20", "2025-02-17", "2025-04-18", "2025-05-26", "2025-06-19",
+           "2025-07-04", "2025-09-01", "2025-11-27", "2025-12-25"],
+    2026: ["2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25", "2026-06-19", "2026-07-03",
+           "2026-09-07", "2026-11-26", "2026-12-25"],
+    2027: ["2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31", "2027-06-18", "2027-07-05",
+           "2027-09-06", "2027-11-25", "2027-12-24"],
+}
+EARLY_CLOSES = {
+    2022: ["2022-11-25"],
+    2023: ["2023-07-03", "2023-11-24"],
+    2024: ["2024-07-03", "2024-11-29", "2024-12-24"],
+    2025: ["2025-07-03", "2025-11-28", "2025-12-24"],
+    2026: ["2026-11-27", "2026-12-24"],
+    2027: ["2027-11-26"],
+}
+
+
+def days(values):
+    return {date.fromisoformat(value) for value in values}
+
+
+def test_holidays_and_early_closes_match_nyse():
+    calendar = om.MarketCalendar()
+    for year in HOLIDAYS:
+        holidays, early_closes = calendar._build_year(year)
+        assert holidays == days(HOLIDAYS[year]), year
+        assert early_closes == days(EARLY_CLOSES[year]), year
+
+
+def test_sessions():
+    calendar = om.MarketCalendar()
+    assert calendar.session(date(2024, 7, 4)) is None
+    assert calendar.session(date(2024, 7, 6)) is None  # Saturday
+    opens, closes = calendar.session(date(2024, 11, 29))
+    assert (opens.hour, opens.minute, closes.hour) == (9, 30, 13)
+    opens, closes = calendar.session(date(2024, 7, 5))
+    assert closes.hour == 16
+    assert calendar.is_open(calendar.TZ.localize(datetime(2024, 7, 5, 10, 0)))
+    assert not calendar.is_open(calendar.TZ.localize(datetime(2024, 7, 5, 16, 0)))
+    assert not calendar.is_open(calendar.TZ.localize(datetime(2024, 11, 29, 13, 30)))
+
+
+def test_next_transition_skips_weekends_and_holidays():
+    calendar = om.MarketCalendar()
+    tz = calendar.TZ
+    # Thursday before Good Friday 2024, after the close: next is Monday's open
+    when, opens = calendar.next_transition(tz.localize(datetime(2024, 3, 28, 17, 0)))
+    assert opens and when == tz.localize(datetime(2024, 4, 1, 9, 30))
+    when, opens = calendar.next_transition(tz.localize(datetime(2024, 12, 24, 11, 0)))
+    assert not opens and when == tz.localize(datetime(2024, 12, 24, 13, 0))
+    now = tz.localize(datetime(2024, 1, 1, 12, 0))
+    for _ in range(50):
+        when, opens = calendar.next_transition(now)
+        assert when > now and calendar.is_open(when) == opens
+        assert calendar.is_open(when - timedelta(minutes=1)) != opens
+        now = when
+
+
+def test_last_close():
+    calendar = om.MarketCalendar()
+    tz = calendar.TZ
+    friday_close = tz.localize(datetime(2024, 3, 28, 16, 0))  # Thursday before Good Friday
+    assert calendar.last_close(tz.localize(datetime(2024, 3, 30, 12, 0))) == friday_close
+    assert calendar.last_close(tz.localize(datetime(2024, 4, 1, 10, 0))) == friday_close  # Monday, in session
+    assert calendar.last_close(tz.localize(datetime(2024, 4, 1, 16, 0))) == tz.localize(datetime(2024, 4, 1, 16, 0))
+    assert calendar.last_close(tz.localize(datetime(2024, 11, 29, 14, 0))) == tz.localize(datetime(2024, 11, 29, 13, 0))
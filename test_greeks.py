@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+
+import OptionsMonitor as om
+
+RATE = 0.04
+
+
+def contracts(seed=3, size=500):
+    rng = np.random.default_rng(seed)
+    is_call = rng.random(size) < 0.5
+    spot = rng.uniform(20, 500, size)
+    strike = spot * rng.uniform(0.7, 1.3, size)
+    years = rng.integers(1, 730, size) / 365
+    sigma = rng.uniform(0.05, 1.5, size)
+    return is_call, spot, strike, years, sigma
+
+
+def price(is_call, spot, strike, years, sigma):
+    return om.black_scholes(is_call, spot, strike, np.sqrt(years), np.exp(-RATE * years), sigma)[0]
+
+
+def test_implied_vol_recovers_sigma():
+    is_call, spot, strike, years, sigma = contracts()
+    sqrt_t, discount = np.sqrt(years), np.exp(-RATE * years)
+    premium, d1, _ = om.black_scholes(is_call, spot, strike, sqrt_t, discount, sigma)
+    iv = om.implied_vol(is_call, spot, strike, sqrt_t, discount, premium)
+    # Deep out of the money with little time the price barely depends on sigma; judge those by the price
+    assert np.allclose(price(is_call, spot, strike, years, iv), premium, atol=1e-5)
+    sensitive = spot * om.norm_pdf(d1) * sqrt_t > 1e-2
+    assert sensitive.mean() > 0.9
+    assert np.allclose(iv[sensitive], sigma[sensitive], atol=1e-4)
+
+
+def test_implied_vol_is_nan_when_nothing_fits():
+    is_call = np.array([True, False, True])
+    spot = np.array([100.0, 100.0, 100.0])
+    strike = np.array([80.0, 120.0, 100.0])
+    years = np.full(3, 0.5)
+    premium = np.array([1.0, 5.0, 150.0])  # below intrinsic twice, above the spot once
+    iv = om.implied_vol(is_call, spot, strike, np.sqrt(years), np.exp(-RATE * years), premium)
+    assert np.isnan(iv).all()
+
+
+def test_greeks_match_finite_differences():
+    is_call, spot, strike, years, sigma = contracts(seed=5, size=200)
+    premium = price(is_call, spot, strike, years, sigma)
+    greeks = om.option_greeks(is_call, spot, strike, years, np.sqrt(years), np.exp(-RATE * years), RATE, premium)
+
+    h = spot * 1e-2
+    up = price(is_call, spot + h, strike, years, sigma)
+    down = price(is_call, spot - h, strike, years, sigma)
+    assert np.allclose(greeks["Delta"], (up - down) / (2 * h), atol=1e-3)
+    assert np.allclose(greeks["Gamma"], (up - 2 * premium + down) / (h * h), rtol=1e-2, atol=1e-5)
+
+    dv = 1e-3
+    vega = (price(is_call, spot, strike, years, sigma + dv) - price(is_call, spot, strike, years, sigma - dv)) / (2 * dv)
+    assert np.allclose(greeks["Vega"], vega / 100, rtol=1e-3, atol=1e-5)
+
+    day = 1 / 365
+    longer = years > 2 * day
+    theta = (price(is_call, spot, strike, years - day / 10, sigma) - premium) / (day / 10) / 365
+    assert np.allclose(greeks["Theta"][longer], theta[longer], rtol=1e-2, atol=1e-4)
+
+
+def test_norm_cdf_accuracy():
+    x = np.linspace(-6, 6, 1001)
+    exact = np.array([0.5 * math.erfc(-value / math.sqrt(2)) for value in x.tolist()])
+    assert np.abs(om.norm_cdf(x) - exact).max() < 1.5e-7
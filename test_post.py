@@ -0,0 +1,64 @@
+import threading
+import time
+import tkinter as tk
+
+import OptionsMonitor as om
+
+
+def monitor():
+    # Only the hand-over between worker threads and the Tk thread; Tcl has an event loop but needs no display
+    app = om.OptionsMonitor.__new__(om.OptionsMonitor)
+    app.root = tk.Tcl()
+    app._posted = om.SimpleQueue()
+    app._closed = False
+    app._post_job = app.root.after(app.POST_POLL_MS, app._drain_posted)
+    return app
+
+
+def pump(app, done, timeout=2.0):
+    # update() outside mainloop(), as a modal dialog's nested loop or the benchmark would run it
+    deadline = time.monotonic() + timeout
+    while not done() and time.monotonic() < deadline:
+        app.root.update()
+        time.sleep(0.001)
+
+
+def test_worker_results_reach_tk_thread_outside_mainloop():
+    app = monitor()
+    received = []
+    workers = [threading.Thread(target=app._post, args=(received.append, n)) for n in range(20)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    pump(app, lambda: len(received) == 20)
+    assert sorted(received) == list(range(20))
+
+
+def test_failing_callback_does_not_stop_polling(capsys):
+    app = monitor()
+    received = []
+
+    def fail():
+        raise ValueError("boom")
+    threading.Thread(target=lambda: (app._post(fail), app._post(received.append, 1))).start()
+    pump(app, lambda: received)
+    assert received == [1]
+    assert "boom" in capsys.readouterr().err
+    app._post(received.append, 2)
+    pump(app, lambda: len(received) == 2)
+    assert received == [1, 2]
+
+
+def test_tcl_errors_ignored_only_after_close(capsys):
+    app = monitor()
+
+    def gone():
+        raise tk.TclError("invalid command name")
+    app._post(gone)
+    pump(app, lambda: app._posted.empty())
+    assert "invalid command name" in capsys.readouterr().err
+    app._closed = True
+    app._post(gone)
+    app._drain_posted()
+    assert capsys.readouterr().err == ""
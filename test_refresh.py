@@ -0,0 +1,35 @@
+from datetime import date
+
+import OptionsMonitor as om
+
+TODAY = date(2026, 3, 16)
+
+
+def intervals(rows, quotes):
+    store = om.PositionStore()
+    for row in rows:
+        store.add(*row)
+    valuation = om.BookValuation(store, quotes)
+    result = om.refresh_intervals(valuation, TODAY, 60, 3600)
+    return dict(zip(valuation.tickers.tolist(), result.tolist()))
+
+
+def test_near_the_money_expiring_today_is_most_urgent():
+    result = intervals([("AAPL", "3/16", "Call", 1, 100.0, 200.0), ("MSFT", "6/18", "Call", 1, 100.0, 200.0)],
+                       {"AAPL": 200.0, "MSFT": 140.0})
+    assert result["AAPL"] == 60
+    assert 60 < result["MSFT"] <= 3600
+
+
+def test_expired_positions_wait_the_longest():
+    # Two weeks past expiry and right at the strike: nothing left to flip
+    result = intervals([("AAPL", "3/2", "Call", 1, 100.0, 200.0), ("IBM", "3/2", "Put", 1, 100.0, 150.0)],
+                       {"AAPL": 200.0})
+    assert result == {"AAPL": 3600, "IBM": 3600}
+
+
+def test_ticker_follows_its_most_urgent_position():
+    result = intervals([("AAPL", "3/2", "Call", 1, 100.0, 200.0), ("AAPL", "3/20", "Call", 1, 100.0, 201.0),
+                        ("MSFT", "", "Call", 1, 100.0, 400.0)], {"AAPL": 200.0})
+    assert result["AAPL"] < 120
+    assert result["MSFT"] == 60  # no quote yet
@@ -0,0 +1,52 @@
+import numpy as np
+
+import OptionsMonitor as om
+
+COLUMNS = ("Ticker", "Ends", "Option", "Contracts", "Premium", "Strike", "Current", "Diff", "Outcome", "Value")
+
+
+def tied_book(random_book, seed):
+    # Few distinct strikes, premiums and prices, so most sort keys tie
+    return random_book(seed, size=3000, tickers=60, low=10, high=30, coarse=True)
+
+
+def test_incremental_update_matches_full_build(random_book):
+    for seed in range(3):
+        store, quotes, names, rng = tied_book(random_book, seed)
+        valuation = om.BookValuation(store, quotes)
+        for col in COLUMNS:
+            for reverse in (False, True):
+                index = om.SortIndex(col, reverse)
+                index.build(valuation)
+                for _ in range(20):
+                    moved = rng.sample(names, rng.choice((1, 2, 3, 20)))  # 20 tickers forces the full-rebuild path
+                    update = {}
+                    for name in moved:
+                        update[name] = float(rng.randint(10, 30)) if rng.random() < 0.9 else "?"
+                    valuation.set_prices(update)
+                    index.update(valuation, update)
+                    full = om.SortIndex(col, reverse)
+                    full.build(valuation)
+                    assert np.array_equal(index.display_order(), full.display_order()), (col, reverse)
+
+
+def test_static_columns_ignore_quotes(random_book):
+    store, quotes, names, _ = tied_book(random_book, 4)
+    valuation = om.BookValuation(store, quotes)
+    index = om.SortIndex("Strike", False)
+    index.build(valuation)
+    before = index.display_order().copy()
+    valuation.set_prices({names[0]: 99.0})
+    assert index.update(valuation, {names[0]: 99.0}) is False
+    assert np.array_equal(index.display_order(), before)
+
+
+def test_unquoted_rows_sort_last(random_book):
+    store, quotes, names, _ = tied_book(random_book, 5)
+    valuation = om.BookValuation(store, quotes)
+    index = om.SortIndex("Current", False)
+    index.build(valuation)
+    current = valuation.current[index.display_order()]
+    quoted = ~np.isnan(current)
+    assert quoted[:quoted.sum()].all() and not quoted[quoted.sum():].any()
+    assert (np.diff(current[quoted]) >= 0).all()
@@ -0,0 +1,95 @@
+import os
+
+import OptionsMonitor as om
+
+
+def write_book(path, rows):
+    store = om.PositionStore()
+    for row in rows:
+        store.add(*row)
+    om.write_positions_csv(path, store)
+
+
+def test_sqlite_seeds_from_csv_once(tmp_path):
+    csv_path = str(tmp_path / "data.csv")
+    db_path = str(tmp_path / "data.db")
+    write_book(csv_path, [("AAPL", "1/17", "Call", 1, 100.0, 200.0), ("MSFT", "", "Put", 2, 50.0, 300.0)])
+
+    storage = om.SqliteStorage(db_path, csv_path)
+    store = storage.load()
+    assert [p.ticker for p in store] == ["AAPL", "MSFT"]
+    storage.clear(store)
+    storage.conn.close()
+
+    store = om.SqliteStorage(db_path, csv_path).load()
+    assert len(store) == 0  # Remove All sticks
+
+
+def test_sqlite_last_position_removed_stays_removed(tmp_path):
+    csv_path = str(tmp_path / "data.csv")
+    db_path = str(tmp_path / "data.db")
+    write_book(csv_path, [("AAPL", "1/17", "Call", 1, 100.0, 200.0)])
+    storage = om.SqliteStorage(db_path, csv_path)
+    store = storage.load()
+    storage.delete(store, [p.id for p in store.remove([p.id for p in store])])
+    storage.conn.close()
+    assert len(om.SqliteStorage(db_path, csv_path).load()) == 0
+
+
+def test_sqlite_round_trip(tmp_path):
+    db_path = str(tmp_path / "data.db")
+    storage = om.SqliteStorage(db_path)
+    store = storage.load()
+    position = store.add("AAPL", "1/17", "Call", 1, 100.0, 200.0)
+    storage.insert(store, position)
+    store.update(position.id, "strike", 210.0)
+    storage.update(store, store.get(position.id), "strike")
+    storage.conn.close()
+    reloaded = list(om.SqliteStorage(db_path).load())
+    assert [(p.id, p.ticker, p.strike) for p in reloaded] == [(position.id, "AAPL", 210.0)]
+
+
+def test_csv_write_is_complete_and_leaves_no_temp(tmp_path):
+    path = str(tmp_path / "data.csv")
+    write_book(path, [("AAPL", "1/17", "Call", 1, 100.0, 200.0)])
+    assert os.listdir(tmp_path) == ["data.csv"]
+    assert [p.ticker for p in om.CsvStorage(path).load()] == ["AAPL"]
+
+
+def test_data_csv_keeps_rows_only_import_rejects(tmp_path):
+    # What the original load_data accepted still loads and survives a save; Import CSV is stricter
+    path = str(tmp_path / "data.csv")
+    with open(path, 'w', newline='') as f:
+        f.write("Ticker,Ends,Option,Contracts,Premium,Strike\n"
+                "AAPL,1/17,Call,1,100,200\n"
+                "MSFT,Jan 17,Call,1,50,400\n"
+                "IBM,1/17,Straddle,2,10,150\n"
+                "SPY,1/17,Put,x,1,500\n"
+                "QQQ,1/17,Put,1,400\n")
+    storage = om.CsvStorage(path)
+    report = om.ImportReport()
+    store = storage.load(report)
+    assert [p.ticker for p in store] == ["AAPL", "MSFT", "IBM", "QQQ"]
+    assert report.rejected == 1
+    storage.save(store)
+    assert [(p.ticker, p.ends, p.option) for p in storage.load()] == [
+        ("AAPL", "1/17", "Call"), ("MSFT", "Jan 17", "Call"), ("IBM", "1/17", "Straddle"), ("QQQ", "1/17", "Put")]
+
+    imported = om.PositionStore()
+    report = om.read_positions_csv(path, imported)
+    assert [p.ticker for p in imported] == ["AAPL", "QQQ"]
+    assert report.rejected == 2
+
+
+def test_atomic_write_keeps_old_file_on_failure(tmp_path):
+    path = str(tmp_path / "quotes.json")
+    with om.atomic_write(path) as f:
+        f.write("old")
+    try:
+        with om.atomic_write(path) as f:
+            f.write("partial")
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+    assert open(path).read() == "old"
+    assert os.listdir(tmp_path) == ["quotes.json"]
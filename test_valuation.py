@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+
+import OptionsMonitor as om
+
+
+def baseline_row(option, contracts, premium, strike_price, current_price):
+    # The per-row Diff/Outcome/Value from the original populate_treeview
+    if current_price in ["....", "?"] or math.isnan(current_price):
+        return float('nan'), "", None
+    diff = current_price - strike_price if option == "Call" else strike_price - current_price
+    if option == "Put":
+        outcome = "Purchase" if strike_price > current_price else ""
+    else:
+        outcome = "Sell" if strike_price < current_price else ""
+    if not outcome:
+        return diff, outcome, None
+    if option == "Put":
+        effective_cost = strike_price - (premium / (contracts * 100))
+        value = (current_price - effective_cost) * (contracts * 100)
+    else:
+        value = -((diff * (contracts * 100)) - premium)
+    return diff, outcome, value
+
+
+def check(store, quotes):
+    valuation = om.BookValuation(store, quotes)
+    for i, position in enumerate(valuation.positions):
+        diff, outcome, value = baseline_row(position.option, position.contracts, position.premium, position.strike,
+                                            quotes.get(position.ticker, "...."))
+        if math.isnan(diff):
+            assert math.isnan(valuation.diff[i])
+        else:
+            assert math.isclose(valuation.diff[i], diff, abs_tol=1e-9)
+        assert valuation.outcome(i) == outcome
+        if value is None:
+            assert math.isnan(valuation.value[i])
+        else:
+            assert math.isclose(valuation.value[i], value, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def test_matches_baseline_formulas_on_random_books(random_book):
+    for seed in range(5):
+        store, quotes, _, _ = random_book(seed)
+        check(store, quotes)
+
+
+def test_reprice_matches_fresh_valuation(random_book):
+    store, quotes, _, _ = random_book(7)
+    valuation = om.BookValuation(store, {})
+    assert np.isnan(valuation.diff).all() and not valuation.itm.any()
+    valuation.set_prices(quotes)
+    fresh = om.BookValuation(store, quotes)
+    for name in ("current", "diff", "value"):
+        assert np.array_equal(getattr(valuation, name), getattr(fresh, name), equal_nan=True)
+    assert np.array_equal(valuation.itm, fresh.itm)
+
+
+def test_unquoted_and_otm_rows():
+    store = om.PositionStore()
+    store.add("AAA", "1/17", "Call", 1, 100.0, 50.0)   # placeholder quote
+    store.add("BBB", "1/17", "Put", 1, 100.0, 50.0)    # failed lookup
+    store.add("CCC", "1/17", "Call", 2, 300.0, 50.0)   # OTM
+    store.add("CCC", "1/17", "Put", 2, 300.0, 50.0)    # ITM
+    quotes = {"AAA": "....", "BBB": "?", "CCC": 40.0}
+    valuation = om.BookValuation(store, quotes)
+    assert np.isnan(valuation.diff[:2]).all() and np.isnan(valuation.value[:2]).all()
+    assert [valuation.outcome(i) for i in range(4)] == ["", "", "", "Purchase"]
+    assert valuation.diff[2] == -10.0 and math.isnan(valuation.value[2])
+    assert valuation.value[3] == 300.0 - 10.0 * 200
+    check(store, quotes)
+
+
+def test_empty_book():
+    valuation = om.BookValuation(om.PositionStore(), {"AAA": 10.0})
+    assert len(valuation.ids) == 0 and len(valuation.tickers) == 0
+    assert valuation.diff.shape == valuation.value.shape == (0,)
+    valuation.set_prices({"AAA": 11.0})